@@ -0,0 +1,105 @@
+import random
+import asyncio
+import logging
+from typing import Callable, Dict, Any, List, Optional
+
+class AdminNotifier:
+    """Sends new-user alerts to the admin from a background task.
+
+    ``sender(text)`` is the blocking Twilio call (run in a thread) and must raise
+    on failure so it can be retried with exponential backoff. With
+    ``digest_window`` > 0, users seen within the window are sent as one message.
+    """
+    def __init__(self, sender: Callable[[str], None], max_queue: int = 1000, max_attempts: int = 4,
+                 backoff: float = 1.0, digest_window: float = 0):
+        self.logger = logging.getLogger("admin_notifier")
+        log_handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        log_handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(log_handler)
+        self.logger.setLevel(logging.INFO)
+        self.sender = sender
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.digest_window = digest_window
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+        self.queued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self, user: str) -> bool:
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(user)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.logger.warning(f"Admin notification queue full, dropping {user}")
+            return False
+        self.queued += 1
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            users = [await self._queue.get()]
+            if self.digest_window > 0:
+                users.extend(await self._collect(self.digest_window))
+            await self._send(", ".join(dict.fromkeys(users)))
+
+    async def _collect(self, window: float) -> List[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        users = []
+        while len(users) < self.max_queue:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                users.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return users
+
+    async def _send(self, text: str) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(self.sender, text)
+                self.sent += 1
+                self.logger.info(f"Notified admin about new user(s): {text}")
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.failed += 1
+                    self.logger.error(f"Failed to notify admin after {attempt} attempts: {e}")
+                    return
+                self.retries += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                self.logger.warning(f"Admin notification failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "digest_window": self.digest_window,
+        }
@@ -0,0 +1,129 @@
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+class AnswerCache:
+    """Answer cache for PDFQATool keyed by normalized question text.
+
+    Exact matches are looked up by normalized text; near-duplicates are matched
+    by cosine similarity of the query embedding. Entries expire after ``ttl``
+    seconds and the least recently used entry is dropped above ``max_entries``.
+    The whole cache is cleared when the bound index hash changes.
+    """
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, similarity_threshold: float = 0.95):
+        self.logger = logging.getLogger("answer_cache")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.index_hash = None
+        self._entries = OrderedDict()  # normalized question -> (answer, unit vector or None, created_at)
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        q = re.sub(r"[^\w\s]", " ", (question or "").lower())
+        return " ".join(q.split())
+
+    def bind_index(self, index_hash: str) -> None:
+        with self._lock:
+            if self.index_hash != index_hash:
+                if self._entries:
+                    self.logger.info(f"Index changed ({self.index_hash} -> {index_hash}), clearing {len(self._entries)} cached answers")
+                self._entries.clear()
+                self._matrix = None
+                self.index_hash = index_hash
+
+    def get(self, question: str, vector: Optional[List[float]] = None) -> Optional[str]:
+        """Exact lookup, then (if a query vector is given) nearest-neighbour lookup.
+
+        Only a call that ends the lookup counts towards the stats: an exact miss
+        without a vector is not counted, so callers can probe before embedding.
+        """
+        key = self.normalize(question)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0]
+            if vector is None:
+                return None
+            match = self._nearest(vector)
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.semantic_hits += 1
+                return self._entries[match][0]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str, vector: Optional[List[float]] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self.normalize(question)
+        unit = None
+        if vector is not None:
+            v = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            unit = v / norm if norm else None
+        with self._lock:
+            self._entries[key] = (answer, unit, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, (_, _, created) in self._entries.items() if now - created >= self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _nearest(self, vector: List[float]) -> Optional[str]:
+        if self._matrix is None:
+            self._matrix_keys = [k for k, (_, unit, _) in self._entries.items() if unit is not None]
+            self._matrix = np.stack([self._entries[k][1] for k in self._matrix_keys]) if self._matrix_keys else np.empty((0, 0), dtype=np.float32)
+        if not self._matrix_keys:
+            return None
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if not norm:
+            return None
+        scores = self._matrix @ (q / norm)
+        best = int(np.argmax(scores))
+        if float(scores[best]) >= self.similarity_threshold:
+            return self._matrix_keys[best]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException
+import os
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-import uvicorn
-from sales_rag_bot import SalesRAGBot
+from sales_rag_bot import SalesRAGEngine, sse_event
+from conversation_pool import ConversationPool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 app = FastAPI(
     title="Sales RAG Bot API",
@@ -21,24 +23,31 @@ app.add_middleware(
 
 # Initialize the chatbot
 # pdf_path = 'C:/Users/admin/Documents/Document/Bot/src/FSTC_Contact.pdf'
-pdf_path = '/home/ubuntu/Whatsapp/ServiceZoneUAE.pdf'
-chatbot = SalesRAGBot(pdf_path)
+pdf_path = os.getenv("KNOWLEDGE_BASE", '/home/ubuntu/Whatsapp/ServiceZoneUAE.pdf')  # a PDF or a directory of PDFs
+engine = SalesRAGEngine(pdf_path)
+# One agent (lead state, memory, turn lock) per caller, all sharing the engine
+conversations = ConversationPool(engine, max_size=5000, idle_timeout=1800)
 
 class ChatInput(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     lead_info: Optional[Dict[str, Any]] = None
     lead_state: str
 
+def conversation_key(chat_input: ChatInput, request: Request) -> str:
+    """The caller's session_id, falling back to the client address."""
+    return chat_input.session_id or (request.client.host if request.client else "anonymous")
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(chat_input: ChatInput):
+async def chat(chat_input: ChatInput, request: Request):
     """
     Process a chat message and return the bot's response
     """
     try:
-        result = chatbot.process_message(chat_input.message)
+        result = await conversations.get(conversation_key(chat_input, request)).aprocess(chat_input.message)
         return ChatResponse(
             response=result['response'],
             lead_info=result['lead_info'],
@@ -46,3 +55,16 @@ async def chat(chat_input: ChatInput):
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(chat_input: ChatInput, request: Request):
+    """
+    Stream the bot's response as Server-Sent Events: `token` events, then a final `state` event
+    """
+    agent = conversations.get(conversation_key(chat_input, request))
+
+    async def events():
+        async for event in agent.astream(chat_input.message):
+            yield sse_event(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytz
+
+# (OwnerId, start, end) with timezone-aware datetimes
+EventInterval = Tuple[str, datetime, datetime]
+
+class AvailabilityEngine:
+    """Slot availability as per-(advisor, day) bitmaps.
+
+    Bit ``i`` of a day's mask is set when slot ``i`` (``day_start + i * slot``
+    in the configured timezone) overlaps any event. Free slots are the clear
+    bits, so merging advisors or days is plain integer arithmetic.
+    """
+    def __init__(self, tz_name: str = "Asia/Kolkata", day_start: str = "08:00", day_end: str = "17:00",
+                 slot_minutes: int = 30, working_days: Iterable[int] = range(7)):
+        self.tz = pytz.timezone(tz_name)
+        self.day_start = datetime.strptime(day_start, "%H:%M").time()
+        self.day_end = datetime.strptime(day_end, "%H:%M").time()
+        self.slot = timedelta(minutes=slot_minutes)
+        self.working_days = frozenset(working_days)
+        span = datetime.combine(date.min, self.day_end) - datetime.combine(date.min, self.day_start)
+        self.slots_per_day = int(span / self.slot)
+        self.full_mask = (1 << self.slots_per_day) - 1
+        self.labels = [(datetime.combine(date.min, self.day_start) + i * self.slot).strftime("%H:%M")
+                       for i in range(self.slots_per_day)]
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+
+    # ---- Time helpers
+
+    def day_open(self, day: date) -> datetime:
+        return self.tz.localize(datetime.combine(day, self.day_start))
+
+    def slot_start(self, day: date, index: int) -> datetime:
+        return self.tz.normalize(self.day_open(day) + index * self.slot)
+
+    def slot_index(self, label: str) -> Optional[int]:
+        return self._label_index.get(label)
+
+    def is_working_day(self, day: date) -> bool:
+        return day.weekday() in self.working_days
+
+    def days(self, start_day: date, end_day: date) -> List[date]:
+        return [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)
+                if self.is_working_day(start_day + timedelta(days=i))]
+
+    def utc_bounds(self, start_day: date, end_day: date) -> Tuple[datetime, datetime]:
+        """UTC window covering the working hours of every day in the range (for one bulk query)."""
+        return self.day_open(start_day).astimezone(pytz.utc), \
+            self.tz.localize(datetime.combine(end_day, self.day_end)).astimezone(pytz.utc)
+
+    # ---- Bitmaps
+
+    def busy_masks(self, events: Iterable[EventInterval], start_day: date, end_day: date) -> Dict[Tuple[str, date], int]:
+        masks: Dict[Tuple[str, date], int] = {}
+        for owner, start, end in events:
+            start_local = start.astimezone(self.tz)
+            end_local = max(end, start + self.slot).astimezone(self.tz)  # zero-length events still block their slot
+            day = max(start_local.date(), start_day)
+            while day <= min(end_local.date(), end_day):
+                opened = self.day_open(day)
+                first = max(0, int((start_local - opened) // self.slot))
+                last = min(self.slots_per_day, -int(-(end_local - opened) // self.slot))
+                if last > first:
+                    key = (owner, day)
+                    masks[key] = masks.get(key, 0) | (((1 << (last - first)) - 1) << first)
+                day += timedelta(days=1)
+        return masks
+
+    def free_indexes(self, busy_mask: int) -> List[int]:
+        free = ~busy_mask & self.full_mask
+        indexes = []
+        while free:
+            low = free & -free
+            indexes.append(low.bit_length() - 1)
+            free ^= low
+        return indexes
+
+    def free_labels(self, busy_mask: int) -> List[str]:
+        return [self.labels[i] for i in self.free_indexes(busy_mask)]
+
+    def next_free(self, busy: Dict[Tuple[str, date], int], owners: List[str], count: int, after: datetime,
+                  end_day: date) -> List[Tuple[datetime, str]]:
+        """Earliest ``count`` (slot start, owner) pairs after ``after`` across all owners."""
+        after_local = after.astimezone(self.tz)
+        found = []
+        for day in self.days(after_local.date(), end_day):
+            free = {owner: ~busy.get((owner, day), 0) & self.full_mask for owner in owners}
+            for index in self.free_indexes(~self._or(free.values()) & self.full_mask):
+                start = self.slot_start(day, index)
+                if start <= after_local:
+                    continue
+                owner = next(o for o in owners if free[o] >> index & 1)
+                found.append((start, owner))
+                if len(found) == count:
+                    return found
+        return found
+
+    @staticmethod
+    def _or(masks: Iterable[int]) -> int:
+        combined = 0
+        for mask in masks:
+            combined |= mask
+        return combined
+
+def make_availability_engine() -> AvailabilityEngine:
+    """Build the engine from SF_CALENDAR_TZ, SF_DAY_START, SF_DAY_END, SF_SLOT_MINUTES and SF_WORKING_DAYS.
+
+    ``SF_WORKING_DAYS`` is a comma-separated list of weekday numbers (0 = Monday);
+    every day is a working day when it is unset.
+    """
+    working_days = os.getenv("SF_WORKING_DAYS")
+    return AvailabilityEngine(
+        tz_name=os.getenv("SF_CALENDAR_TZ", "Asia/Kolkata"),
+        day_start=os.getenv("SF_DAY_START", "08:00"),
+        day_end=os.getenv("SF_DAY_END", "17:00"),
+        slot_minutes=int(os.getenv("SF_SLOT_MINUTES", "30")),
+        working_days=[int(d) for d in working_days.split(",") if d.strip()] if working_days else range(7),
+    )
@@ -0,0 +1,69 @@
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "by", "from", "is", "are", "was",
+    "be", "do", "does", "did", "can", "could", "would", "will", "you", "your", "we", "our", "i", "me", "my", "it",
+    "its", "this", "that", "these", "those", "what", "which", "who", "how", "when", "where", "there", "any", "have",
+    "has", "about", "please", "tell", "know", "want", "like", "need", "get", "much", "many", "some", "us",
+}
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]  # villas -> villa, doors -> door
+        terms.append(word)
+    return terms
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring over a fixed list of texts.
+
+    Document ids are positions in the list given to the constructor, so
+    they line up with the FAISS index positions of the same chunks.
+    """
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_terms: List[frozenset] = []
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            tf = Counter(tokenize(text))
+            lengths.append(sum(tf.values()))
+            self.doc_terms.append(frozenset(tf))
+            for term, count in tf.items():
+                self.postings.setdefault(term, []).append((doc_id, count))
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        n = len(texts)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def search(self, query: str, k: int = 8) -> List[Tuple[int, float]]:
+        """Top ``k`` (doc id, score) pairs, best first."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+    def confident(self, query: str, hits: List[Tuple[int, float]], max_terms: int = 4) -> bool:
+        """True when lexical hits alone are trustworthy for a short keyword query.
+
+        Every query term must occur in the corpus (so nothing is being
+        paraphrased), and the best hit must contain all of them.
+        """
+        terms = set(tokenize(query))
+        if not hits or not terms or len(terms) > max_terms:
+            return False
+        if any(term not in self.idf for term in terms):
+            return False
+        return terms <= self.doc_terms[hits[0][0]]
@@ -0,0 +1,101 @@
+import re
+import logging
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from conversation_memory import count_tokens, truncate_tokens
+
+class ContextPacker:
+    """Turns retrieved chunks into the smallest prompt context that still covers them.
+
+    ``select`` picks k from the similarity scores. It keeps at least
+    ``min_k`` and at most ``max_k`` hits, and drops any hit scoring more than
+    ``score_margin`` below the best one. ``pack`` stitches together chunks from
+    the same page that overlap or nest, because the splitter's chunk_overlap
+    repeats text between neighbours. It then drops near-duplicates and stops
+    at ``token_budget`` tokens.
+    """
+    def __init__(self, token_budget: int = 1200, min_k: int = 3, max_k: int = 8, score_margin: float = 0.05,
+                 min_overlap: int = 20, max_overlap: int = 300, duplicate_threshold: float = 0.8):
+        self.logger = logging.getLogger("context_packer")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.token_budget = token_budget
+        self.min_k = min_k
+        self.max_k = max_k
+        self.score_margin = score_margin
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.duplicate_threshold = duplicate_threshold
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def select(self, scored: List[Tuple[Document, float]]) -> List[Document]:
+        """``scored`` is (doc, relevance) best first, relevance higher-is-better."""
+        if not scored:
+            return []
+        best = scored[0][1]
+        return [doc for i, (doc, score) in enumerate(scored[:self.max_k])
+                if i < self.min_k or score >= best - self.score_margin]
+
+    def _stitch(self, a: str, b: str) -> Optional[str]:
+        """``a`` followed by ``b`` when b repeats a's tail (or is contained in a), else None."""
+        if b in a:
+            return a
+        for n in range(min(len(a), len(b) - 1, self.max_overlap), self.min_overlap - 1, -1):
+            if a.endswith(b[:n]):
+                return a + b[n:]
+        return None
+
+    def _merge_page(self, texts: List[str]) -> List[str]:
+        merged: List[str] = []
+        for text in texts:
+            for i, kept in enumerate(merged):
+                joined = self._stitch(kept, text) or self._stitch(text, kept)
+                if joined is not None:
+                    merged[i] = joined
+                    break
+            else:
+                merged.append(text)
+        return merged
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        words = re.findall(r"\w+", text.lower())
+        return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+    def pack(self, docs: List[Document]) -> str:
+        # Group by (source, page) in rank order so the best page comes first.
+        pages = {}
+        for doc in docs:
+            key = (doc.metadata.get("source"), doc.metadata.get("page"))
+            pages.setdefault(key, []).append(doc.page_content)
+        pieces = [piece for texts in pages.values() for piece in self._merge_page(texts)]
+        kept, kept_shingles = [], []
+        budget = self.token_budget
+        for piece in pieces:
+            shingles = self._shingles(piece)
+            if any(len(shingles & other) / len(shingles | other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            tokens = count_tokens(piece)
+            if tokens > budget:
+                if budget >= 50:
+                    kept.append(truncate_tokens(piece, budget))
+                break
+            kept.append(piece)
+            kept_shingles.append(shingles)
+            budget -= tokens
+        context = "\n".join(kept)
+        before = sum(count_tokens(doc.page_content) for doc in docs)
+        after = count_tokens(context)
+        self.tokens_in += before
+        self.tokens_out += after
+        self.logger.info(f"[RAG] Packed {len(docs)} chunks into {len(kept)} pieces ({before} -> {after} tokens)")
+        return context
+
+    def stats(self):
+        saved = 1 - self.tokens_out / self.tokens_in if self.tokens_in else 0.0
+        return {"tokens_in": self.tokens_in, "tokens_out": self.tokens_out, "saved": round(saved, 3)}
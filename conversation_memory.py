@@ -0,0 +1,130 @@
+import logging
+from collections import deque
+from typing import List
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding file unavailable
+    _ENCODING = None
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text: str, limit: int) -> str:
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text)
+        return text if len(tokens) <= limit else _ENCODING.decode(tokens[:limit]) + "…"
+    return text if len(text) <= limit * 4 else text[:limit * 4] + "…"
+
+class ConversationMemory:
+    """Bounded conversation history for prompts.
+
+    Turns live in a ring buffer of ``max_turns`` entries, and a single turn is
+    clipped to ``turn_token_cap`` tokens. Once the buffer is full or its turns
+    exceed ``token_budget`` tokens, ``compact`` folds the oldest turns into a
+    rolling summary of at most ``summary_tokens``. The folding stops when the
+    buffer is back to half its size and half the budget, so the summarizer
+    runs only now and then. ``recent`` hands prompts the summary followed by the newest turns.
+    """
+    def __init__(self, max_turns: int = 30, token_budget: int = 1500, turn_token_cap: int = 300,
+                 summary_tokens: int = 250):
+        self.logger = logging.getLogger("conversation_memory")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.turn_token_cap = turn_token_cap
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self._turns = deque()  # (text, tokens)
+        self._tokens = 0
+        self._evicted: List[str] = []  # pushed out of the ring before they could be summarized
+        self.summaries = 0
+
+    def append(self, turn: str) -> None:
+        turn = truncate_tokens(turn, self.turn_token_cap)
+        tokens = count_tokens(turn)
+        self._turns.append((turn, tokens))
+        self._tokens += tokens
+        if len(self._turns) > self.max_turns:
+            old, old_tokens = self._turns.popleft()
+            self._tokens -= old_tokens
+            self._evicted.append(old)
+
+    def turns(self) -> List[str]:
+        return [turn for turn, _ in self._turns]
+
+    def recent(self, n: int) -> List[str]:
+        """The summary (if any) plus the newest turns: at most ``n`` lines and ``token_budget`` tokens."""
+        lines = []
+        budget = self.token_budget - count_tokens(self.summary)
+        slots = n - 1 if self.summary else n
+        for turn, tokens in reversed(self._turns):
+            if len(lines) >= slots or tokens > budget:
+                break
+            lines.append(turn)
+            budget -= tokens
+        lines.reverse()
+        if self.summary:
+            lines.insert(0, f"Summary of earlier conversation: {self.summary}")
+        return lines
+
+    def _due(self) -> List[str]:
+        """Pop the turns that must be folded into the summary now (empty when within budget)."""
+        folded, self._evicted = self._evicted, []
+        if folded or self._tokens > self.token_budget or len(self._turns) >= self.max_turns:
+            while self._turns and (self._tokens > self.token_budget // 2 or len(self._turns) > self.max_turns // 2):
+                turn, tokens = self._turns.popleft()
+                self._tokens -= tokens
+                folded.append(turn)
+        return folded
+
+    def _summary_prompt(self, folded: List[str]) -> str:
+        words = int(self.summary_tokens * 0.75)
+        return (
+            f"Summarize this sales conversation in at most {words} words. Keep what the customer needs, property and "
+            "service details, any contact details they shared and anything the assistant promised.\n\n"
+            f"Summary so far: {self.summary or 'None'}\n\nNew messages:\n" + "\n".join(folded) + "\n\nSummary:"
+        )
+
+    def _store_summary(self, summary: str, folded: List[str]) -> None:
+        self.summary = truncate_tokens(summary.strip(), self.summary_tokens)
+        self.summaries += 1
+        self.logger.info(f"Folded {len(folded)} turns into the rolling summary ({count_tokens(self.summary)} tokens)")
+
+    def _fallback_summary(self, folded: List[str]) -> str:
+        # Keep the customer's own words when the summarizer is unavailable.
+        said = " ".join(turn for turn in folded if turn.startswith("Human:"))
+        return f"{self.summary} {said}".strip()[-self.summary_tokens * 4:]
+
+    def compact(self, llm) -> None:
+        folded = self._due()
+        if not folded:
+            return
+        try:
+            summary = llm.invoke(self._summary_prompt(folded)).content
+        except Exception as e:
+            self.logger.error(f"Summarizing conversation failed: {e}")
+            summary = self._fallback_summary(folded)
+        self._store_summary(summary, folded)
+
+    async def acompact(self, llm) -> None:
+        folded = self._due()
+        if not folded:
+            return
+        try:
+            summary = (await llm.ainvoke(self._summary_prompt(folded))).content
+        except Exception as e:
+            self.logger.error(f"Summarizing conversation failed: {e}")
+            summary = self._fallback_summary(folded)
+        self._store_summary(summary, folded)
+
+    def __len__(self) -> int:
+        return len(self._turns)
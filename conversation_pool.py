@@ -0,0 +1,72 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any
+from sales_rag_bot import SalesRAGAgent, SalesRAGEngine
+
+class ConversationPool:
+    """LRU pool of per-user SalesRAGAgent objects sharing one SalesRAGEngine.
+
+    Conversations idle for longer than ``idle_timeout`` seconds are evicted, and
+    the least recently used one is dropped once ``max_size`` is reached.
+    """
+    def __init__(self, engine: SalesRAGEngine, max_size: int = 5000, idle_timeout: float = 1800):
+        self.logger = logging.getLogger("conversation_pool")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.engine = engine
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._agents = OrderedDict()  # key -> (agent, last_used)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> SalesRAGAgent:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._agents.get(key)
+            if entry is not None:
+                agent = entry[0]
+                self._agents.move_to_end(key)
+            else:
+                agent = SalesRAGAgent(engine=self.engine)
+                self.created += 1
+                while len(self._agents) >= self.max_size:
+                    old_key, _ = self._agents.popitem(last=False)
+                    self.evicted += 1
+                    self.logger.info(f"Evicted least recently used conversation {old_key}")
+            self._agents[key] = (agent, now)
+            return agent
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._agents.pop(key, None)
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now: float) -> int:
+        removed = 0
+        # OrderedDict is kept in last-used order, so stop at the first fresh entry.
+        while self._agents:
+            key, (_, last_used) = next(iter(self._agents.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._agents.popitem(last=False)
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": len(self._agents), "created": self.created, "evicted": self.evicted, "max_size": self.max_size}
@@ -0,0 +1,318 @@
+import os
+import json
+import pickle
+import shutil
+import time
+import hashlib
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_community.vectorstores import FAISS
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from bm25_index import BM25Index
+
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+# Cache entries younger than this are never pruned: another manager sharing the
+# cache may have written them before recording them in its manifest.
+PRUNE_GRACE_SECONDS = 3600
+
+# (text, metadata, embedding) for one chunk
+EmbeddedChunk = Tuple[str, dict, List[float]]
+
+# (path, first page, end page) of one parsing task
+PageRange = Tuple[str, int, int]
+
+def _page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+def _parse_pages(task: PageRange) -> List[Tuple[str, dict]]:
+    """Load and split a range of pages of one PDF (runs in a worker process)."""
+    path, start, stop = task
+    reader = PdfReader(path)
+    pages = [Document(page_content=reader.pages[i].extract_text(), metadata={"source": path, "page": i})
+             for i in range(start, stop)]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
+    return [(doc.page_content, doc.metadata) for doc in splitter.split_documents(pages)]
+
+def page_ranges(page_counts: Dict[str, int], workers: int) -> List[PageRange]:
+    """Split every document into page ranges so ``workers`` processes get similar shares, even for one big PDF."""
+    total = sum(page_counts.values())
+    size = max(1, -(-total // max(1, workers)))
+    return [(path, start, min(start + size, count))
+            for path, count in page_counts.items() for start in range(0, count, size)]
+
+class Corpus:
+    """One fully built, immutable version of the knowledge base.
+
+    ``docs[i]`` is the chunk at FAISS position ``i`` and BM25 document ``i``.
+    """
+    __slots__ = ("vector_store", "docs", "lexical_index", "index_hash", "sources")
+
+    def __init__(self, vector_store: FAISS, docs: List[Document], index_hash: str, sources: Dict[str, str]):
+        self.vector_store = vector_store
+        self.docs = docs
+        self.lexical_index = BM25Index([doc.page_content for doc in docs])
+        self.index_hash = index_hash
+        self.sources = sources  # path -> document key
+
+class CorpusManager:
+    """Builds the knowledge base from one PDF or a directory of PDFs.
+
+    Each document is keyed by a hash of its bytes, the splitter settings and
+    the embedding model. Its chunks and vectors are cached under
+    ``<index_cache_dir>/docs/<key>.pkl``, so a rebuild only parses and
+    embeds the documents that are new or changed. Parsing is spread over a
+    process pool by page range, so a single large PDF is parallel too.
+    Removed documents just drop out of the next build. The combined FAISS index is
+    cached too, under a hash of the sorted document keys, and is loaded with
+    mmap when nothing changed. ``refresh`` builds the new Corpus next to the
+    live one and swaps a single reference, so readers never see a
+    half-built index.
+
+    Several sources may share one ``index_cache_dir``. Each records the
+    document keys and index hash it uses in ``manifests/<source hash>.json``,
+    and pruning only removes cache entries no manifest refers to.
+    """
+    def __init__(self, source: str, embeddings, embedding_model: str, index_cache_dir: str,
+                 workers: Optional[int] = None, on_swap: Optional[Callable[[Corpus], None]] = None):
+        self.logger = logging.getLogger("corpus_manager")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.source = source
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.index_cache_dir = index_cache_dir
+        self.workers = workers or int(os.getenv("CORPUS_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.on_swap = on_swap
+        self._hash_memo: Dict[str, Tuple[float, int, str]] = {}  # path -> (mtime, size, key)
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self.current: Optional[Corpus] = None
+        self.refreshes = 0
+
+    # ---- Documents
+
+    def _pdf_paths(self) -> List[str]:
+        if not os.path.isdir(self.source):
+            return [self.source]
+        paths = []
+        for root, _, files in os.walk(self.source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        return sorted(paths)
+
+    def _settings(self) -> bytes:
+        return json.dumps({"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+                           "embedding_model": self.embedding_model}, sort_keys=True).encode()
+
+    def _document_key(self, path: str) -> str:
+        """Content hash of one PDF; re-read only when its mtime or size changes."""
+        stat = os.stat(path)
+        memo = self._hash_memo.get(path)
+        if memo and memo[:2] == (stat.st_mtime, stat.st_size):
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        h.update(self._settings())
+        key = h.hexdigest()[:32]
+        self._hash_memo[path] = (stat.st_mtime, stat.st_size, key)
+        return key
+
+    def _doc_cache_path(self, key: str) -> str:
+        return os.path.join(self.index_cache_dir, "docs", f"{key}.pkl")
+
+    def _load_document(self, key: str) -> Optional[List[EmbeddedChunk]]:
+        try:
+            with open(self._doc_cache_path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def _save_document(self, key: str, chunks: List[EmbeddedChunk]) -> None:
+        path = self._doc_cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(chunks, f)
+        os.replace(tmp_path, path)
+
+    def _ingest(self, paths: List[str]) -> Dict[str, List[EmbeddedChunk]]:
+        """Parse new or changed documents page range by page range in a process pool, then embed them."""
+        tasks = page_ranges({path: _page_count(path) for path in paths}, self.workers)
+        if len(tasks) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                results = list(pool.map(_parse_pages, tasks))
+        else:
+            results = [_parse_pages(task) for task in tasks]
+        parsed: Dict[str, List[Tuple[str, dict]]] = {path: [] for path in paths}
+        for (path, _, _), chunks in zip(tasks, results):
+            parsed[path].extend(chunks)  # tasks are in page order within each document
+        texts = [text for path in paths for text, _ in parsed[path]]
+        self.logger.info(f"Embedding {len(texts)} chunks from {len(paths)} new or changed documents ({len(tasks)} page ranges)")
+        vectors = iter(self.embeddings.embed_documents(texts)) if texts else iter(())
+        return {path: [(text, metadata, next(vectors)) for text, metadata in parsed[path]] for path in paths}
+
+    # ---- Combined index
+
+    def _index_path(self, index_hash: str) -> str:
+        return os.path.join(self.index_cache_dir, index_hash)
+
+    def _load_cached_index(self, index_hash: str) -> Optional[Tuple[FAISS, List[Document]]]:
+        path = self._index_path(index_hash)
+        index_file = os.path.join(path, "index.faiss")
+        store_file = os.path.join(path, "index.pkl")
+        if not (os.path.exists(index_file) and os.path.exists(store_file)):
+            self.logger.info(f"No cached index for {self.source} ({index_hash})")
+            return None
+        try:
+            import faiss
+            try:
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except Exception:
+                # Older faiss builds can't mmap flat indexes; a plain read is still embedding-free.
+                index = faiss.read_index(index_file)
+            with open(store_file, "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            vector_store = FAISS(embedding_function=self.embeddings, index=index, docstore=docstore,
+                                 index_to_docstore_id=index_to_docstore_id)
+            docs = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+            self.logger.info(f"Loaded cached index {index_hash} with {len(docs)} chunks.")
+            return vector_store, docs
+        except Exception as e:
+            self.logger.warning(f"Failed to load cached index {path}, rebuilding: {e}")
+            return None
+
+    def _save_cached_index(self, index_hash: str, vector_store: FAISS) -> None:
+        path = self._index_path(index_hash)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(self.index_cache_dir, exist_ok=True)
+            vector_store.save_local(tmp_path)
+            if os.path.exists(path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            else:
+                os.replace(tmp_path, path)
+            self.logger.info(f"Saved index cache to {path}")
+        except Exception as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            self.logger.warning(f"Failed to save index cache to {path}: {e}")
+
+    def _build(self, sources: Dict[str, str], index_hash: str) -> Tuple[FAISS, List[Document]]:
+        chunks: Dict[str, List[EmbeddedChunk]] = {}
+        missing = []
+        for path, key in sources.items():
+            cached = self._load_document(key)
+            if cached is None:
+                missing.append(path)
+            else:
+                chunks[path] = cached
+        for path, embedded in self._ingest(missing).items():
+            self._save_document(sources[path], embedded)
+            chunks[path] = embedded
+        ordered = [chunk for path in sorted(chunks) for chunk in chunks[path]]
+        if not ordered:
+            raise ValueError(f"No PDF content found in {self.source}")
+        vector_store = FAISS.from_embeddings([(text, vector) for text, _, vector in ordered], self.embeddings,
+                                             metadatas=[metadata for _, metadata, _ in ordered])
+        self._save_cached_index(index_hash, vector_store)
+        ids = vector_store.index_to_docstore_id
+        docs = [vector_store.docstore.search(ids[i]) for i in range(len(ids))]
+        self.logger.info(f"Built index {index_hash}: {len(docs)} chunks from {len(sources)} documents "
+                         f"({len(missing)} embedded, {len(sources) - len(missing)} reused)")
+        return vector_store, docs
+
+    def _manifest_dir(self) -> str:
+        return os.path.join(self.index_cache_dir, "manifests")
+
+    def _write_manifest(self, sources: Dict[str, str], index_hash: str) -> None:
+        name = hashlib.sha256(os.path.abspath(self.source).encode()).hexdigest()[:32]
+        path = os.path.join(self._manifest_dir(), f"{name}.json")
+        os.makedirs(self._manifest_dir(), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": os.path.abspath(self.source), "documents": sorted(set(sources.values())),
+                       "index_hash": index_hash}, f)
+        os.replace(tmp_path, path)
+
+    def _live_entries(self) -> Tuple[set, set]:
+        """Document keys and index hashes referenced by any source's manifest."""
+        documents, indexes = set(), set()
+        manifest_dir = self._manifest_dir()
+        for name in os.listdir(manifest_dir) if os.path.isdir(manifest_dir) else []:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(manifest_dir, name), encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            documents.update(manifest.get("documents", []))
+            indexes.add(manifest.get("index_hash"))
+        return documents, indexes
+
+    def _prune(self, sources: Dict[str, str], index_hash: str) -> None:
+        """Drop cached embeddings and combined indexes that no source sharing the cache still uses."""
+        self._write_manifest(sources, index_hash)
+        documents, indexes = self._live_entries()
+        cutoff = time.time() - PRUNE_GRACE_SECONDS
+        docs_dir = os.path.join(self.index_cache_dir, "docs")
+        for name in os.listdir(docs_dir) if os.path.isdir(docs_dir) else []:
+            path = os.path.join(docs_dir, name)
+            if name.endswith(".pkl") and name[:-4] not in documents and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                self.logger.info(f"Dropped cached embeddings of removed document {name[:-4]}")
+        for name in os.listdir(self.index_cache_dir):
+            path = os.path.join(self.index_cache_dir, name)
+            if (len(name) == 32 and set(name) <= set("0123456789abcdef") and name not in indexes and os.path.isdir(path)
+                    and os.path.getmtime(path) < cutoff):
+                shutil.rmtree(path, ignore_errors=True)
+                self.logger.info(f"Dropped cached index {name}")
+
+    # ---- Lifecycle
+
+    def refresh(self) -> bool:
+        """Bring the corpus in line with the files on disk; returns True when a new version was swapped in."""
+        with self._refresh_lock:
+            sources = {path: self._document_key(path) for path in self._pdf_paths()}
+            index_hash = hashlib.sha256(json.dumps(sorted(sources.values())).encode()).hexdigest()[:32]
+            if self.current is not None and self.current.index_hash == index_hash:
+                return False
+            loaded = self._load_cached_index(index_hash) or self._build(sources, index_hash)
+            corpus = Corpus(loaded[0], loaded[1], index_hash, sources)
+            previous, self.current = self.current, corpus
+            self.refreshes += 1
+            if previous is not None:
+                added = set(sources) - set(previous.sources)
+                removed = set(previous.sources) - set(sources)
+                self.logger.info(f"Swapped in corpus {index_hash} (+{len(added)} / -{len(removed)} documents)")
+            if self.on_swap is not None:
+                self.on_swap(corpus)
+            self._prune(sources, index_hash)
+            return True
+
+    def watch(self, interval: float) -> None:
+        """Re-scan the source every ``interval`` seconds in a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.logger.error(f"Corpus refresh failed: {e}")
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=loop, name="corpus-watcher", daemon=True)
+            self._watcher.start()
+
+    def stats(self) -> Dict[str, object]:
+        corpus = self.current
+        return {"documents": len(corpus.sources) if corpus else 0, "chunks": len(corpus.docs) if corpus else 0,
+                "index_hash": corpus.index_hash if corpus else None, "refreshes": self.refreshes}
@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+GREETING = "greeting"
+OFF_TOPIC = "off_topic"
+KNOWLEDGE = "knowledge"
+
+GREETING_REPLY = (
+    "Hello! 👋 Welcome to ServiceZone UAE. I can help with our painting services, the property types we work on, "
+    "our location and working hours, or booking a meeting with our team. What would you like to know?"
+)
+OFF_TOPIC_REPLY = (
+    "Sorry, I can only answer questions related to ServiceZone UAE Property, meetings, or our services. "
+    "Please ask something related."
+)
+
+GREETINGS = {
+    "hi", "hii", "hiii", "hello", "hey", "hey there", "hello there", "hi there", "good morning", "good afternoon",
+    "good evening", "salam", "salaam", "assalamualaikum", "marhaba", "how are you", "how r u", "how are u",
+    "what's up", "whats up", "yo", "greetings",
+}
+# Any of these words means the question is about us; go straight to the knowledge base.
+DOMAIN_WORDS = {
+    "servicezone", "service", "services", "paint", "painting", "painter", "painters", "villa", "villas", "apartment",
+    "office", "commercial", "interior", "exterior", "wall", "walls", "door", "doors", "kids", "room", "decorative",
+    "property", "properties", "project", "projects", "location", "located", "address", "branch", "hours", "timing",
+    "open", "meeting", "appointment", "visit", "site", "quote", "price", "cost", "team", "company", "dubai",
+    "sharjah", "abu", "dhabi", "uae", "marina", "experience", "warranty", "colour", "color", "colours", "colors",
+}
+
+# Seed examples; extend with real transcripts via INTENT_TRAINING_FILE (JSONL of {"text", "intent"}).
+SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("hi how are you doing today", GREETING),
+    ("hello good morning", GREETING),
+    ("hey there nice to meet you", GREETING),
+    ("good evening hope you are well", GREETING),
+    ("what is the weather today", OFF_TOPIC),
+    ("who won the football match yesterday", OFF_TOPIC),
+    ("tell me a joke", OFF_TOPIC),
+    ("write me a python program", OFF_TOPIC),
+    ("what is the capital of france", OFF_TOPIC),
+    ("give me a recipe for biryani", OFF_TOPIC),
+    ("who is the president of america", OFF_TOPIC),
+    ("what is the bitcoin price today", OFF_TOPIC),
+    ("can you help with my homework", OFF_TOPIC),
+    ("recommend a good movie", OFF_TOPIC),
+    ("where are you located", KNOWLEDGE),
+    ("do you paint villas", KNOWLEDGE),
+    ("what are your working hours", KNOWLEDGE),
+    ("what services do you offer", KNOWLEDGE),
+    ("can you paint my office", KNOWLEDGE),
+    ("how long does interior painting take", KNOWLEDGE),
+    ("do you do exterior house painting", KNOWLEDGE),
+    ("tell me about your company", KNOWLEDGE),
+    ("which areas do you cover", KNOWLEDGE),
+    ("what kind of paint do you use", KNOWLEDGE),
+    ("i want to book a meeting", KNOWLEDGE),
+    ("what projects have you done", KNOWLEDGE),
+    ("what is your phone number", KNOWLEDGE),
+    ("how can i contact you", KNOWLEDGE),
+    ("what is your email address", KNOWLEDGE),
+    ("who is the owner", KNOWLEDGE),
+    ("who is the manager of the company", KNOWLEDGE),
+    ("can i get a discount", KNOWLEDGE),
+    ("do you have any offers", KNOWLEDGE),
+    ("are you available tomorrow", KNOWLEDGE),
+    ("when can your team come", KNOWLEDGE),
+    ("can you help me", KNOWLEDGE),
+    ("i need help with my house", KNOWLEDGE),
+]
+
+# Function words carry no intent; keeping them let "what is the ..." / "can you ..." decide the class.
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "by", "from", "is", "are", "was",
+    "were", "be", "do", "does", "did", "can", "could", "would", "will", "should", "i", "me", "my", "you", "your",
+    "we", "our", "us", "it", "its", "this", "that", "what", "which", "who", "whom", "how", "when", "where", "why",
+    "there", "any", "have", "has", "had", "get", "some", "about", "please", "tell", "give", "lot", "much",
+}
+
+def _tokens(text: str) -> List[str]:
+    words = [w for w in re.findall(r"[a-z0-9']+", (text or "").lower()) if w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+class IntentRouter:
+    """Local, embedding-free classifier that picks greeting / off_topic / knowledge.
+
+    Exact greetings and domain keywords are decided by rule; everything else
+    goes through a TF-IDF nearest-centroid model over content words. A
+    canned intent wins only when it beats KNOWLEDGE by ``min_margin``;
+    anything uncertain goes to the knowledge base, because a wrong refusal
+    costs more than one retrieval.
+    """
+    def __init__(self, examples: Optional[List[Tuple[str, str]]] = None, min_similarity: float = 0.25,
+                 min_margin: float = 0.2):
+        self.logger = logging.getLogger("intent_router")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.counts = Counter()
+        self.fit(examples if examples is not None else SEED_EXAMPLES + self._load_training_file())
+
+    @staticmethod
+    def _load_training_file() -> List[Tuple[str, str]]:
+        path = os.getenv("INTENT_TRAINING_FILE")
+        if not path or not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [(row["text"], row["intent"]) for row in rows if row.get("intent") in (GREETING, OFF_TOPIC, KNOWLEDGE)]
+
+    def fit(self, examples: List[Tuple[str, str]]) -> None:
+        docs = [(Counter(_tokens(text)), intent) for text, intent in examples]
+        df = Counter(term for tf, _ in docs for term in tf)
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        sums: Dict[str, Counter] = {}
+        for tf, intent in docs:
+            sums.setdefault(intent, Counter()).update(self._unit(self._weigh(tf)))
+        self.centroids = {intent: self._unit(vec) for intent, vec in sums.items()}
+
+    def _weigh(self, tf: Counter) -> Dict[str, float]:
+        return {term: count * self.idf[term] for term, count in tf.items() if term in self.idf}
+
+    @staticmethod
+    def _unit(vec: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {k: v / norm for k, v in vec.items()} if norm else {}
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        text = " ".join(re.findall(r"[a-z0-9']+", (message or "").lower()))
+        if text in GREETINGS:
+            return GREETING, 1.0
+        if DOMAIN_WORDS.intersection(text.split()):
+            return KNOWLEDGE, 1.0
+        query = self._unit(self._weigh(Counter(_tokens(text))))
+        if not query:
+            # Nothing the model knows; let retrieval decide.
+            return KNOWLEDGE, 0.0
+        scores = {intent: sum(w * centroid.get(t, 0.0) for t, w in query.items()) for intent, centroid in self.centroids.items()}
+        intent, score = max(scores.items(), key=lambda kv: kv[1])
+        if intent == KNOWLEDGE or score < self.min_similarity or score - scores.get(KNOWLEDGE, 0.0) < self.min_margin:
+            return KNOWLEDGE, score
+        return intent, score
+
+    def route(self, message: str) -> str:
+        intent, score = self.classify(message)
+        self.counts[intent] += 1
+        self.logger.info(f"Routed message to {intent} (score {score:.2f})")
+        return intent
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts)
@@ -0,0 +1,42 @@
+import re
+from typing import Iterable, Optional
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+class KeywordMatcher:
+    """Word-boundary-aware multi-phrase matcher built once from a keyword set.
+
+    Keywords (single words or phrases) are stored in a trie keyed by word, so
+    a message is tokenized once and scanned in a single left-to-right pass;
+    "rating" never matches inside "decorating" and "amount" never matches
+    inside "paramount".
+    """
+    _END = object()
+
+    def __init__(self, keywords: Iterable[str]):
+        self.root = {}
+        self.max_len = 0
+        for keyword in keywords:
+            words = _WORD_RE.findall(keyword.lower())
+            if not words:
+                continue
+            node = self.root
+            for word in words:
+                node = node.setdefault(word, {})
+            node[self._END] = keyword
+            self.max_len = max(self.max_len, len(words))
+
+    def find(self, text: str) -> Optional[str]:
+        words = _WORD_RE.findall((text or "").lower())
+        for i in range(len(words)):
+            node = self.root
+            for word in words[i:i + self.max_len]:
+                node = node.get(word)
+                if node is None:
+                    break
+                if self._END in node:
+                    return node[self._END]
+        return None
+
+    def __contains__(self, text: str) -> bool:
+        return self.find(text) is not None
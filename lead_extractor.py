@@ -0,0 +1,65 @@
+import re
+from typing import Dict, Tuple
+
+EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+# UAE mobiles/landlines (+971 / 00971 / 0 prefixes) first, then generic E.164-style numbers.
+UAE_PHONE_RE = re.compile(r"(?<![\d+])(?:\+971|00971|971|0)[\s-]?(?:5\d|[2-9])(?:[\s-]?\d){7}(?!\d)")
+INTL_PHONE_RE = re.compile(r"(?<![\d+])\+?\d(?:[\s-]?\d){7,14}(?!\d)")
+# Explicit cues: whatever follows is meant as the name.
+NAME_RE = re.compile(
+    r"\b(?:my name is|name is|name:)\s+"
+    r"([A-Za-z][A-Za-z'.-]*(?:\s+(?!and\b|my\b|email\b|phone\b|number\b)[A-Za-z][A-Za-z'.-]*){0,2})",
+    re.IGNORECASE,
+)
+# Soft cues ("i am planning ...", "this is urgent", "call me tomorrow") only count when followed by capitalised words.
+SOFT_NAME_RE = re.compile(
+    r"\b(?i:i am|i'm|im|this is|call me)\s+([A-Z][A-Za-z'.-]*(?:\s+[A-Z][A-Za-z'.-]*){0,2})\b"
+)
+# Words that commonly wrap contact details and carry no information of their own.
+FILLER_WORDS = {
+    "my", "is", "and", "the", "email", "e-mail", "mail", "id", "address", "phone", "mobile", "number", "no",
+    "contact", "whatsapp", "tel", "name", "it's", "its", "here", "you", "can", "reach", "me", "at", "on", "ok",
+    "okay", "sure", "yes", "thanks", "thank", "hi", "hello", "call", "please",
+}
+# "I am interested" / "I'm looking" are not names.
+NOT_NAMES = {"interested", "looking", "not", "from", "here", "fine", "good", "ok", "okay", "a", "an", "the", "in", "at"}
+
+def normalize_phone(raw: str) -> str:
+    digits = re.sub(r"[^\d+]", "", raw)
+    if digits.startswith("00"):
+        digits = "+" + digits[2:]
+    elif digits.startswith("971"):
+        digits = "+" + digits
+    elif digits.startswith("0") and len(digits) == 10:
+        digits = "+971" + digits[1:]
+    return digits
+
+def extract_contact_fields(message: str) -> Tuple[Dict[str, str], str]:
+    """Pull Email, Phone and Name out of ``message`` with regexes.
+
+    Returns the fields found and the message text left after removing them,
+    so callers can tell whether anything unexplained remains.
+    """
+    fields: Dict[str, str] = {}
+    rest = message or ""
+    match = EMAIL_RE.search(rest)
+    if match:
+        fields["Email"] = match.group(0)
+        rest = rest.replace(match.group(0), " ")
+    match = UAE_PHONE_RE.search(rest) or INTL_PHONE_RE.search(rest)
+    if match:
+        fields["Phone"] = normalize_phone(match.group(0))
+        rest = rest.replace(match.group(0), " ")
+    match = NAME_RE.search(rest) or SOFT_NAME_RE.search(rest)
+    if match and match.group(1).split()[0].lower() not in NOT_NAMES:
+        fields["Name"] = " ".join(w.capitalize() if w.islower() else w for w in match.group(1).split())
+        rest = rest.replace(match.group(0), " ")
+    return fields, rest
+
+def has_unexplained_words(rest: str) -> bool:
+    words = re.findall(r"[a-z][a-z'-]*", rest.lower())
+    return any(w not in FILLER_WORDS for w in words)
+
+def looks_like_contact_info(message: str) -> bool:
+    fields, _ = extract_contact_fields(message)
+    return bool(fields)
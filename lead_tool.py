@@ -1,11 +1,29 @@
 import json
-from typing import Dict, Any, Optional, List
+import asyncio
+import threading
+from typing import Dict, Optional, List, Tuple
 from lead_state import LeadState
 from salesforce_api import SalesforceAPI
+from salesforce_outbox import SalesforceOutbox
+from lead_extractor import extract_contact_fields, has_unexplained_words
 import logging
 
+# Process-wide, so the totals survive ConversationPool evicting individual LeadTools.
+_extraction_lock = threading.Lock()
+_extraction_counts = {"local": 0, "llm": 0}
+
+def _count_extraction(kind: str) -> int:
+    with _extraction_lock:
+        _extraction_counts[kind] += 1
+        return _extraction_counts[kind]
+
+def extraction_stats() -> Dict[str, int]:
+    """Lead-info extractions done by the regex fast path ("local", an LLM call avoided) vs by the LLM."""
+    with _extraction_lock:
+        return dict(_extraction_counts)
+
 class LeadTool:
-    def __init__(self):
+    def __init__(self, salesforce_api: Optional[SalesforceAPI] = None, outbox: Optional[SalesforceOutbox] = None):
         self.logger = logging.getLogger("lead_tool")
         handler = logging.StreamHandler()
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -13,14 +31,15 @@ class LeadTool:
         if not self.logger.hasHandlers():
             self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
-        self.salesforce = SalesforceAPI()
+        self.salesforce = salesforce_api if salesforce_api is not None else SalesforceAPI()
+        # With an outbox the lead is written behind and current_lead_id is a local outbox reference.
+        self.outbox = outbox
         self.partial_lead_info = {}
         self.state = LeadState.NO_INTEREST
         self.current_lead_id = None
 
-    def extract_lead_info(self, message: str, llm) -> Optional[Dict[str, str]]:
-        self.logger.info(f"Extracting lead info from message: {message}")
-        prompt = (
+    def _extraction_prompt(self, message: str) -> str:
+        return (
             "Extract contact information from the following message. "
             "Return ONLY a minified JSON object (no markdown, no code block, no comments) with these exact fields (always include all keys, even if missing): "
             "Name, Company, Email, Phone. If a field is not found, return its value as null. "
@@ -28,12 +47,12 @@ class LeadTool:
             f"Message: {message}\n"
             "Return ONLY the JSON object, nothing else."
         )
-        self.logger.info(f"Prompt sent to LLM: {prompt}")
-        response = llm.invoke(prompt)
-        self.logger.info(f"LLM raw response: {response.content}")
+
+    def _parse_extraction(self, raw: str) -> Optional[Dict[str, str]]:
+        self.logger.info(f"LLM raw response: {raw}")
         try:
             # Remove code block markers if present
-            content = response.content.strip()
+            content = raw.strip()
             if content.startswith('```'):
                 content = content.strip('`')
                 if content.startswith('json'):
@@ -56,7 +75,21 @@ class LeadTool:
             self.logger.error(f"Failed to extract lead info: {e}")
         return None
 
-    def update_state(self, message: str, llm) -> None:
+    def extract_lead_info(self, message: str, llm) -> Optional[Dict[str, str]]:
+        self.logger.info(f"Extracting lead info from message: {message}")
+        prompt = self._extraction_prompt(message)
+        self.logger.info(f"Prompt sent to LLM: {prompt}")
+        response = llm.invoke(prompt)
+        return self._parse_extraction(response.content)
+
+    async def aextract_lead_info(self, message: str, llm) -> Optional[Dict[str, str]]:
+        self.logger.info(f"Extracting lead info from message: {message}")
+        prompt = self._extraction_prompt(message)
+        self.logger.info(f"Prompt sent to LLM: {prompt}")
+        response = await llm.ainvoke(prompt)
+        return self._parse_extraction(response.content)
+
+    def _detect_interest(self, message: str) -> None:
         self.logger.info(f"Updating lead state. Current state: {self.state}, message: {message}")
         self.logger.info(f"Current partial_lead_info before update: {self.partial_lead_info}")
         interest_indicators = []
@@ -64,30 +97,76 @@ class LeadTool:
             if any(ind in message.lower() for ind in interest_indicators):
                 self.logger.info("Interest detected in message.")
                 self.state = LeadState.INTEREST_DETECTED
-        if self.state in [LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO]:
-            lead_info = self.extract_lead_info(message, llm)
-            self.logger.info(f"Lead info returned from extract_lead_info: {lead_info}")
-            if lead_info:
-                self.partial_lead_info.update(lead_info)
-                self.logger.info(f"Updated partial_lead_info: {self.partial_lead_info}")
-                self.state = LeadState.COLLECTING_INFO
-                if all(
-                    k in self.partial_lead_info and self.partial_lead_info[k] not in [None, "N/A", ""]
-                    for k in ['Name', 'Email', 'Phone']
-                ):
-                    self.state = LeadState.INFO_COMPLETE
-                    self.logger.info("Lead info complete.")
+
+    def _needs_extraction(self) -> bool:
+        return self.state in [LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO]
+
+    def _apply_lead_info(self, lead_info: Optional[Dict[str, str]]) -> None:
+        self.logger.info(f"Lead info returned from extract_lead_info: {lead_info}")
+        if lead_info:
+            self.partial_lead_info.update(lead_info)
+            self.logger.info(f"Updated partial_lead_info: {self.partial_lead_info}")
+            self.state = LeadState.COLLECTING_INFO
+            if all(
+                k in self.partial_lead_info and self.partial_lead_info[k] not in [None, "N/A", ""]
+                for k in ['Name', 'Email', 'Phone']
+            ):
+                self.state = LeadState.INFO_COMPLETE
+                self.logger.info("Lead info complete.")
+
+    def _log_state(self) -> None:
         self.logger.info(f"Current partial_lead_info after update: {self.partial_lead_info}")
         self.logger.info(f"Current state after update: {self.state}")
 
+    def _extract_locally(self, message: str) -> Tuple[bool, Optional[Dict[str, str]]]:
+        """Regex fast path: (handled, lead_info). handled=False means the LLM is still needed.
+
+        The message is handled locally when it fills every missing field, or when
+        whatever it does not explain is just filler around the fields found.
+        """
+        fields, rest = extract_contact_fields(message)
+        missing = [f for f in ['Name', 'Email', 'Phone'] if f not in fields and f not in self.partial_lead_info]
+        if missing and (not fields or has_unexplained_words(rest)):
+            return False, None
+        avoided = _count_extraction("local")
+        self.logger.info(f"Extracted lead fields locally: {fields} (LLM calls avoided: {avoided})")
+        if not fields:
+            return True, None
+        normalized = dict(self.partial_lead_info)
+        for key, value in fields.items():
+            # A regex-found name never replaces one already collected.
+            if key == 'Name' and normalized.get('Name'):
+                continue
+            normalized[key] = value
+        normalized['Company'] = 'Iquestbee Technology'
+        return True, normalized
+
+    def update_state(self, message: str, llm) -> None:
+        self._detect_interest(message)
+        if self._needs_extraction():
+            handled, lead_info = self._extract_locally(message)
+            if not handled:
+                _count_extraction("llm")
+                lead_info = self.extract_lead_info(message, llm)
+            self._apply_lead_info(lead_info)
+        self._log_state()
+
+    async def aupdate_state(self, message: str, llm) -> None:
+        self._detect_interest(message)
+        if self._needs_extraction():
+            handled, lead_info = self._extract_locally(message)
+            if not handled:
+                _count_extraction("llm")
+                lead_info = await self.aextract_lead_info(message, llm)
+            self._apply_lead_info(lead_info)
+        self._log_state()
+
     def get_missing_fields(self) -> List[str]:
         missing = [f for f in ['Name', 'Email', 'Phone'] if f not in self.partial_lead_info or self.partial_lead_info[f] == "N/A"]
         self.logger.info(f"Missing lead fields: {missing}")
         return missing
 
-    def create_lead(self) -> Optional[str]:
-        self.logger.info(f"Creating lead in Salesforce with info: {self.partial_lead_info}")
-        lead_created, lead_id = self.salesforce.create_lead(self.partial_lead_info)
+    def _lead_created(self, lead_created: bool, lead_id: Optional[str]) -> Optional[str]:
         if lead_created:
             self.current_lead_id = lead_id
             self.state = LeadState.AWAITING_MEETING_CONFIRMATION
@@ -95,3 +174,26 @@ class LeadTool:
             return lead_id
         self.logger.error("Failed to create lead in Salesforce.")
         return None
+
+    def _queue_lead(self) -> Optional[str]:
+        if any(value == "N/A" for value in self.partial_lead_info.values()):
+            self.logger.warning("Lead info contains 'N/A', aborting lead creation.")
+            return self._lead_created(False, None)
+        try:
+            return self._lead_created(True, self.outbox.enqueue_lead(self.partial_lead_info))
+        except Exception as e:
+            self.logger.error(f"Failed to queue lead: {e}")
+            return self._lead_created(False, None)
+
+    def create_lead(self) -> Optional[str]:
+        self.logger.info(f"Creating lead in Salesforce with info: {self.partial_lead_info}")
+        if self.outbox is not None:
+            return self._queue_lead()
+        return self._lead_created(*self.salesforce.create_lead(self.partial_lead_info))
+
+    async def acreate_lead(self) -> Optional[str]:
+        self.logger.info(f"Creating lead in Salesforce with info: {self.partial_lead_info}")
+        if self.outbox is not None:
+            # The outbox insert may wait on SQLite's write lock; keep it off the event loop.
+            return await asyncio.to_thread(self._queue_lead)
+        return self._lead_created(*await self.salesforce.acreate_lead(self.partial_lead_info))
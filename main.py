@@ -1,11 +1,13 @@
 import os
-from sales_rag_bot import SalesRAGAgent
+import asyncio
+from sales_rag_bot import SalesRAGAgent, SalesRAGEngine, sse_event
+from conversation_pool import ConversationPool
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 
 def main():
-    pdf_path = 'ServiceZoneUAE.pdf'  # Update as needed
+    pdf_path = os.getenv("KNOWLEDGE_BASE", 'ServiceZoneUAE.pdf')  # a PDF or a directory of PDFs
     agent = SalesRAGAgent(pdf_path)
     
     print("Welcome to the Agentic Sales Assistant! Type 'quit' to exit.")
@@ -23,12 +25,18 @@ def main():
 
 # --- FastAPI endpoint ---
 app = FastAPI()
-agent_instance = None
+engine = None
+conversations = None
 
 @app.on_event("startup")
 def startup_event():
-    global agent_instance
-    agent_instance = SalesRAGAgent(pdf_path='/home/ubuntu/Whatsapp/ServiceZoneUAE.pdf')
+    # One shared engine; each caller (session_id, else client address) gets its own agent.
+    global engine, conversations
+    engine = SalesRAGEngine(os.getenv("KNOWLEDGE_BASE", '/home/ubuntu/Whatsapp/ServiceZoneUAE.pdf'))
+    conversations = ConversationPool(engine, max_size=5000, idle_timeout=1800)
+
+def conversation_key(request: Request, data: dict) -> str:
+    return str(data.get("session_id") or (request.client.host if request.client else "anonymous"))
 
 @app.post("/chat")
 async def chat_endpoint(request: Request):
@@ -36,9 +44,30 @@ async def chat_endpoint(request: Request):
     message = data.get("message", "")
     if not message:
         return JSONResponse({"error": "No message provided."}, status_code=400)
-    result = agent_instance.process(message)
+    result = await conversations.get(conversation_key(request, data)).aprocess(message)
     return JSONResponse(result)
 
+@app.post("/knowledge/refresh")
+async def refresh_knowledge():
+    changed = await asyncio.to_thread(engine.pdf_qa_tool.refresh)
+    return JSONResponse({"changed": changed, **engine.pdf_qa_tool.corpus_manager.stats()})
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: Request):
+    """Server-Sent Events: `token` events as the reply is generated, then one `state` event."""
+    data = await request.json()
+    message = data.get("message", "")
+    if not message:
+        return JSONResponse({"error": "No message provided."}, status_code=400)
+
+    agent = conversations.get(conversation_key(request, data))
+
+    async def events():
+        async for event in agent.astream(message):
+            yield sse_event(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "api":
@@ -1,9 +1,11 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 from salesforce_api import SalesforceAPI
+from salesforce_outbox import SalesforceOutbox
 import logging
 
 class MeetingTool:
-    def __init__(self, salesforce_api: SalesforceAPI):
+    def __init__(self, salesforce_api: SalesforceAPI, outbox: Optional[SalesforceOutbox] = None):
         self.logger = logging.getLogger("meeting_tool")
         handler = logging.StreamHandler()
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -12,6 +14,7 @@ class MeetingTool:
             self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
         self.salesforce = salesforce_api
+        self.outbox = outbox
         self.available_slots = []
 
     def get_slots(self) -> List[str]:
@@ -20,15 +23,41 @@ class MeetingTool:
         self.logger.info(f"Available slots: {self.available_slots}")
         return self.available_slots
 
-    def schedule(self, lead_id: str, slot: str) -> bool:
-        self.logger.info(f"Scheduling meeting for lead_id={lead_id} at slot={slot}")
-        result = self.salesforce.create_meeting(lead_id, slot)
+    async def aget_slots(self) -> List[str]:
+        self.logger.info("Fetching available meeting slots from Salesforce...")
+        self.available_slots = await self.salesforce.ashow_availableMeeting() or []
+        self.logger.info(f"Available slots: {self.available_slots}")
+        return self.available_slots
+
+    def _log_schedule_result(self, result: bool) -> bool:
         if result:
             self.logger.info("Meeting scheduled successfully.")
         else:
             self.logger.error("Failed to schedule meeting.")
         return result
 
+    def _queue_meeting(self, lead_id: str, slot: str) -> bool:
+        try:
+            self.outbox.enqueue_event(lead_id, slot)
+            self.salesforce.mark_slot_booked(slot)
+            return self._log_schedule_result(True)
+        except Exception as e:
+            self.logger.error(f"Failed to queue meeting: {e}")
+            return self._log_schedule_result(False)
+
+    def schedule(self, lead_id: str, slot: str) -> bool:
+        self.logger.info(f"Scheduling meeting for lead_id={lead_id} at slot={slot}")
+        if self.outbox is not None:
+            return self._queue_meeting(lead_id, slot)
+        return self._log_schedule_result(self.salesforce.create_meeting(lead_id, slot))
+
+    async def aschedule(self, lead_id: str, slot: str) -> bool:
+        self.logger.info(f"Scheduling meeting for lead_id={lead_id} at slot={slot}")
+        if self.outbox is not None:
+            # The outbox insert may wait on SQLite's write lock; keep it off the event loop.
+            return await asyncio.to_thread(self._queue_meeting, lead_id, slot)
+        return self._log_schedule_result(await self.salesforce.acreate_meeting(lead_id, slot))
+
     def format_slots(self, slots: List[str], columns: int = 3) -> str:
         self.logger.info(f"Formatting slots for display: {slots}")
         if not slots:
@@ -0,0 +1,126 @@
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+
+class MessageDedup:
+    """Idempotency cache for Twilio webhooks keyed on MessageSid.
+
+    The first delivery of a SID computes the response; retries of the same SID
+    (including ones that arrive while the first is still running) get the same
+    TwiML back without recomputing. At most ``max_entries`` SIDs are kept, each
+    for ``ttl`` seconds.
+
+    The in-process map only covers one uvicorn worker. With ``path`` set, SIDs
+    are also claimed in a SQLite table shared by every worker on the host: the
+    worker that claims a SID computes the reply, and a retry that lands on
+    another worker waits for that reply instead of running the turn again.
+    Claims without a reply after ``claim_timeout`` seconds (a crashed worker)
+    are taken over.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 600, path: Optional[str] = None,
+                 claim_timeout: float = 60, poll_interval: float = 0.2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()  # sid -> (future, created_at)
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS message_dedup (sid TEXT PRIMARY KEY, response TEXT, created_at REAL NOT NULL)"
+            )
+            self._conn().execute("CREATE INDEX IF NOT EXISTS message_dedup_created_at ON message_dedup (created_at)")
+
+    async def run(self, sid: Optional[str], compute: Callable[[], Awaitable[str]]) -> str:
+        if not sid:
+            return await compute()
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(sid)
+        if entry is not None:
+            self.hits += 1
+            return await asyncio.shield(entry[0])
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[sid] = (future, now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        try:
+            result = await (self._run_shared(sid, compute) if self.path else compute())
+        except BaseException as e:
+            # Let Twilio's next retry recompute instead of replaying a failure.
+            self._entries.pop(sid, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        future.set_result(result)
+        return result
+
+    # ---- Shared claims (one row per SID, across worker processes)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self, sid: str) -> Tuple[bool, Optional[str]]:
+        """(True, None) when this worker now owns ``sid``, else (False, reply so far)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM message_dedup WHERE created_at < ? OR (response IS NULL AND created_at < ?)",
+                         (now - self.ttl, now - self.claim_timeout))
+            claimed = conn.execute("INSERT OR IGNORE INTO message_dedup (sid, created_at) VALUES (?, ?)", (sid, now)).rowcount == 1
+            row = None if claimed else conn.execute("SELECT response FROM message_dedup WHERE sid = ?", (sid,)).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed, row[0] if row else None
+
+    def _store(self, sid: str, response: str) -> None:
+        self._conn().execute("UPDATE message_dedup SET response = ? WHERE sid = ?", (response, sid))
+
+    def _release(self, sid: str) -> None:
+        self._conn().execute("DELETE FROM message_dedup WHERE sid = ? AND response IS NULL", (sid,))
+
+    async def _run_shared(self, sid: str, compute: Callable[[], Awaitable[str]]) -> str:
+        while True:
+            claimed, response = await asyncio.to_thread(self._claim, sid)
+            if claimed:
+                break
+            if response is not None:
+                self.shared_hits += 1
+                return response
+            await asyncio.sleep(self.poll_interval)
+        try:
+            result = await compute()
+        except BaseException:
+            self._release(sid)
+            raise
+        await asyncio.to_thread(self._store, sid, result)
+        return result
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            sid, (future, created) = next(iter(self._entries.items()))
+            if now - created < self.ttl or not future.done():
+                break
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "shared_hits": self.shared_hits}
@@ -1,12 +1,25 @@
-from typing import List, Dict
+import os
+import time
+import numpy as np
+from typing import AsyncIterator, Iterator, List, Dict, Optional
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 import logging
+from answer_cache import AnswerCache
+from context_packer import ContextPacker
+from corpus_manager import Corpus, CorpusManager
+from topic_tracker import TOPIC_MODES, TopicState, chunk_id, retrieval_shifted, topic_from_chunks
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Shorter messages ("yes", "tell me more") only make sense in their conversation.
+MIN_CACHEABLE_WORDS = 3
+NO_CONTEXT_REPLY = "Sorry, I can only answer questions related to ServiceZone UAE Properties, meetings, or our services. Please ask something related."
 
 class PDFQATool:
-    def __init__(self, pdf_path: str, model_name: str = "gpt-4o-mini"):
+    def __init__(self, pdf_path: str, model_name: str = "gpt-4o-mini", embedding_model: str = EMBEDDING_MODEL,
+                 index_cache_dir: Optional[str] = None, answer_cache: Optional[AnswerCache] = None,
+                 topic_mode: Optional[str] = None, topic_refresh_every: int = 4,
+                 context_packer: Optional[ContextPacker] = None):
         self.logger = logging.getLogger("pdf_qa_tool")
         handler = logging.StreamHandler()
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -16,45 +29,202 @@ class PDFQATool:
         self.logger.setLevel(logging.INFO)
         self.pdf_path = pdf_path
         self.llm = ChatOpenAI(model=model_name)
-        self._load_pdf()
-        self._setup_vector_store()
-
-    def _load_pdf(self):
-        self.logger.info(f"Loading PDF from {self.pdf_path}")
-        loader = PyPDFLoader(self.pdf_path)
-        raw_docs = loader.load()
-        splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=100, length_function=len)
-        self.docs = splitter.split_documents(raw_docs)
-        self.logger.info(f"Loaded and split PDF into {len(self.docs)} chunks.")
-
-    def _setup_vector_store(self):
-        self.logger.info("Setting up vector store for PDF Q&A...")
-        embeddings = OpenAIEmbeddings()
-        self.vector_store = FAISS.from_documents(self.docs, embedding=embeddings)
-        self.logger.info("Vector store setup complete.")
-
-    def get_context(self, query: str) -> str:
+        self.embedding_model = embedding_model
+        self.embeddings = OpenAIEmbeddings(model=embedding_model)
+        self.index_cache_dir = index_cache_dir or os.getenv("PDF_INDEX_CACHE_DIR", ".index_cache")
+        # pdf_path may be a single PDF or a directory of PDFs; see CorpusManager.
+        self.corpus_manager = CorpusManager(pdf_path, self.embeddings, embedding_model, self.index_cache_dir,
+                                            on_swap=self._on_corpus_swap)
+        # Short keyword queries fully covered by one chunk skip the query embedding (RAG_LEXICAL_FAST_PATH=0 to disable).
+        self.lexical_fast_path = os.getenv("RAG_LEXICAL_FAST_PATH", "1") == "1"
+        self.lexical_weight = float(os.getenv("RAG_LEXICAL_WEIGHT", "0.3"))
+        self.retrieval_counts = {"lexical": 0, "hybrid": 0}
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        self.corpus_manager.refresh()
+        refresh_every = float(os.getenv("CORPUS_REFRESH_SECONDS", "0"))
+        if refresh_every > 0:
+            self.corpus_manager.watch(refresh_every)
+        self.context_packer = context_packer if context_packer is not None else ContextPacker(
+            token_budget=int(os.getenv("RAG_CONTEXT_TOKENS", "1200")), max_k=int(os.getenv("RAG_MAX_K", "8")))
+        # 'llm': topic LLM call every turn; 'periodic': LLM only every N turns or when
+        # retrieval shifts; 'chunks': topic derived from retrieved chunks, no LLM call.
+        self.topic_mode = topic_mode or os.getenv("RAG_TOPIC_MODE", "llm")
+        if self.topic_mode not in TOPIC_MODES:
+            raise ValueError(f"Unknown topic mode {self.topic_mode!r}, expected one of {TOPIC_MODES}")
+        self.topic_refresh_every = topic_refresh_every
+        self.topic_llm_calls = 0
+        self.topic_turns = 0
+        self.topic_seconds = 0.0
+
+    def _on_corpus_swap(self, corpus: Corpus) -> None:
+        # Answers from the previous corpus may be stale.
+        self.answer_cache.bind_index(corpus.index_hash)
+
+    @property
+    def corpus(self) -> Corpus:
+        return self.corpus_manager.current
+
+    @property
+    def docs(self) -> List[Document]:
+        return self.corpus.docs
+
+    @property
+    def index_hash(self) -> str:
+        return self.corpus.index_hash
+
+    def refresh(self) -> bool:
+        """Re-scan the knowledge base and swap in a new index if any PDF was added, changed or removed."""
+        return self.corpus_manager.refresh()
+
+    @staticmethod
+    def _relevance(distance: float) -> float:
+        # FAISS returns squared L2; OpenAI embeddings are unit length, so cosine = 1 - d / 2.
+        return 1.0 - float(distance) / 2.0
+
+    def _lexical_docs(self, query: str) -> Optional[List[Document]]:
+        """Docs from BM25 alone when it is confident enough to skip the embedding call, else None."""
+        if not self.lexical_fast_path:
+            return None
+        corpus = self.corpus
+        hits = corpus.lexical_index.search(query, k=self.context_packer.max_k)
+        if not corpus.lexical_index.confident(query, hits):
+            return None
+        self.retrieval_counts["lexical"] += 1
+        top = hits[0][1]
+        docs = self.context_packer.select([(corpus.docs[i], score / top) for i, score in hits])
+        self.logger.info(f"[RAG] Lexical fast path: kept {len(docs)} of {len(hits)} BM25 hits")
+        return docs
+
+    def _hybrid_docs(self, query: str, query_vector: List[float]) -> List[Document]:
+        """Vector and BM25 hits fused as ``(1 - w) * cosine + w * bm25 / best_bm25``."""
+        corpus = self.corpus  # one snapshot for the whole lookup; refresh() may swap it concurrently
+        k = self.context_packer.max_k
+        q = np.asarray([query_vector], dtype=np.float32)
+        distances, positions = corpus.vector_store.index.search(q, k)
+        vector = {int(i): self._relevance(d) for d, i in zip(distances[0], positions[0]) if i >= 0}
+        lexical = corpus.lexical_index.search(query, k=k)
+        top = lexical[0][1] if lexical else 1.0
+        lexical = {i: score / top for i, score in lexical}
+        for i in lexical:
+            if i not in vector:
+                # Exact cosine for lexical-only hits, read back from the flat index.
+                vector[i] = float(np.dot(corpus.vector_store.index.reconstruct(i), q[0]))
+        w = self.lexical_weight
+        fused = sorted(((corpus.docs[i], (1 - w) * vector[i] + w * lexical.get(i, 0.0)) for i in vector),
+                       key=lambda pair: pair[1], reverse=True)
+        self.retrieval_counts["hybrid"] += 1
+        docs = self.context_packer.select(fused)
+        self.logger.info(f"[RAG] Hybrid retrieval: kept {len(docs)} of {len(fused)} fused hits ({len(lexical)} lexical)")
+        return docs
+
+    def retrieve(self, query: str, query_vector: Optional[List[float]] = None) -> List[Document]:
+        self.logger.info(f"[RAG] Retrieving context for query: {query}")
+        if query_vector is None:
+            docs = self._lexical_docs(query)
+            if docs is not None:
+                return docs
+            query_vector = self.embeddings.embed_query(query)
+        return self._hybrid_docs(query, query_vector)
+
+    async def aretrieve(self, query: str, query_vector: Optional[List[float]] = None) -> List[Document]:
         self.logger.info(f"[RAG] Retrieving context for query: {query}")
-        docs = self.vector_store.similarity_search(query, k=5)
+        if query_vector is None:
+            docs = self._lexical_docs(query)
+            if docs is not None:
+                return docs
+            query_vector = await self.embeddings.aembed_query(query)
+        return self._hybrid_docs(query, query_vector)
+
+    def get_context(self, query: str, query_vector: Optional[List[float]] = None) -> str:
+        return self._join_context(self.retrieve(query, query_vector))
+
+    def _join_context(self, docs: List[Document]) -> str:
         for i, doc in enumerate(docs):
             self.logger.info(f"[RAG] Context chunk {i+1}: {doc.page_content[:200]}...")
-        context = "\n".join(doc.page_content for doc in docs)
+        context = self.context_packer.pack(docs)
         self.logger.info(f"[RAG] Combined context: {context[:500]}...")
         return context
 
-    def answer(self, message: str, conversation_history: List[str], lead_info: Dict[str, str], lead_state: str) -> str:
-        self.logger.info(f"[RAG] Answering message: {message}")
-        context = self.get_context(message)
-        self.logger.info(f"[RAG] Context used for answer: {context[:500]}...")
-        if not context.strip():
-            self.logger.warning("[RAG] No relevant context found for query.")
-            return "Sorry, I can only answer questions related to ServiceZone UAE Properties, meetings, or our services. Please ask something related."
+    def _topics_prompt(self, recent: List[str]) -> str:
+        self.topic_llm_calls += 1
+        return f"Given these conversation messages, identify the main topic being discussed:\n{chr(10).join(recent)}\nReturn ONLY the topic being discussed, nothing else."
+
+    def _topic_without_llm(self, docs: List[Document], topic_state: Optional[TopicState]) -> Optional[str]:
+        """Topic available without an LLM call, or None when the LLM has to be asked."""
+        if topic_state is None or self.topic_mode == "llm":
+            return None
+        if self.topic_mode == "chunks":
+            return topic_from_chunks(docs)
+        ids = [chunk_id(doc) for doc in docs]
+        if (topic_state.topic is None
+                or topic_state.turns_since_refresh >= self.topic_refresh_every
+                or retrieval_shifted(topic_state.chunk_ids, ids)):
+            return None
+        return topic_state.topic
+
+    def _record_topic(self, topic: str, from_llm: bool, docs: List[Document], topic_state: Optional[TopicState], started: float) -> str:
+        if topic_state is not None:
+            if self.topic_mode == "periodic":
+                topic_state.turns_since_refresh = 0 if from_llm else topic_state.turns_since_refresh + 1
+                topic_state.chunk_ids = [chunk_id(doc) for doc in docs]
+            topic_state.topic = topic
+        self.topic_turns += 1
+        self.topic_seconds += time.perf_counter() - started
+        self.logger.info(f"[RAG] Topic ({self.topic_mode}, {'llm' if from_llm else 'local'}): {topic}")
+        return topic
+
+    def _current_topic(self, recent: List[str], docs: List[Document], topic_state: Optional[TopicState]) -> str:
+        started = time.perf_counter()
+        topic = self._topic_without_llm(docs, topic_state)
+        from_llm = topic is None
+        if from_llm:
+            topic = self.llm.invoke(self._topics_prompt(recent)).content
+        return self._record_topic(topic, from_llm, docs, topic_state, started)
+
+    async def _acurrent_topic(self, recent: List[str], docs: List[Document], topic_state: Optional[TopicState]) -> str:
+        started = time.perf_counter()
+        topic = self._topic_without_llm(docs, topic_state)
+        from_llm = topic is None
+        if from_llm:
+            topic = (await self.llm.ainvoke(self._topics_prompt(recent))).content
+        return self._record_topic(topic, from_llm, docs, topic_state, started)
+
+    def retrieval_stats(self) -> Dict[str, object]:
+        return {**self.retrieval_counts, "context": self.context_packer.stats(), "corpus": self.corpus_manager.stats()}
+
+    def topic_stats(self) -> Dict[str, object]:
+        avg_ms = self.topic_seconds * 1000 / self.topic_turns if self.topic_turns else 0.0
+        return {"mode": self.topic_mode, "turns": self.topic_turns, "llm_calls": self.topic_llm_calls,
+                "seconds": round(self.topic_seconds, 3), "avg_ms": round(avg_ms, 1)}
+
+    def _cacheable(self, message: str, conversation_history: List[str], lead_info: Dict[str, str]) -> bool:
+        """Only self-contained opening questions are shared through the cache.
+
+        The answer to a later turn depends on the conversation (topic, lead
+        stage), so "yes" or "how long does it take?" must not replay another
+        user's answer. Answers that may mention the lead's details are never shared.
+        """
+        if lead_info:
+            return False
+        if any(turn != f"Human: {message}" for turn in conversation_history):
+            return False
+        return len(AnswerCache.normalize(message).split()) >= MIN_CACHEABLE_WORDS
+
+    def _cached_answer(self, message: str, cacheable: bool, query_vector: Optional[List[float]] = None) -> Optional[str]:
+        if not cacheable:
+            return None
+        cached = self.answer_cache.get(message, query_vector)
+        if cached is not None:
+            kind = "exact" if query_vector is None else "semantic"
+            self.logger.info(f"[RAG] Answer cache hit ({kind}): {self.answer_cache.stats()}")
+        return cached
+
+    def _recent(self, conversation_history: List[str]) -> List[str]:
         recent = conversation_history[-4:] if len(conversation_history) > 4 else conversation_history
         self.logger.info(f"[RAG] Recent conversation history: {recent}")
-        topics_prompt = f"Given these conversation messages, identify the main topic being discussed:\n{chr(10).join(recent)}\nReturn ONLY the topic being discussed, nothing else."
-        topic_response = self.llm.invoke(topics_prompt)
-        current_topic = topic_response.content
-        self.logger.info(f"[RAG] LLM topic detected: {current_topic}")
+        return recent
+
+    def _answer_prompt(self, message: str, context: str, current_topic: str, lead_info: Dict[str, str], lead_state: str) -> str:
         system_context = f"Current topic: {current_topic}\nProduct info: {context}\nLead info: {lead_info if lead_info else 'None'}\nLead state: {lead_state}"
         prompt = f"""
 You are a friendly sales assistant for ServiceZone UAE or ServiceZone.
@@ -68,6 +238,119 @@ Human: {message}
 Assistant: Be direct and natural, maintain the conversation flow about {current_topic} if relevant.
 """
         self.logger.info(f"[RAG] LLM prompt: {prompt[:500]}...")
-        response = self.llm.invoke(prompt)
-        self.logger.info(f"[RAG] LLM response: {response.content[:500]}...")
-        return response.content
+        return prompt
+
+    def _finish_answer(self, message: str, answer: str, query_vector: List[float], cacheable: bool) -> str:
+        self.logger.info(f"[RAG] LLM response: {answer[:500]}...")
+        if cacheable:
+            self.answer_cache.put(message, answer, query_vector)
+        return answer
+
+    def answer(self, message: str, conversation_history: List[str], lead_info: Dict[str, str], lead_state: str,
+               topic_state: Optional[TopicState] = None) -> str:
+        self.logger.info(f"[RAG] Answering message: {message}")
+        cacheable = self._cacheable(message, conversation_history, lead_info)
+        cached = self._cached_answer(message, cacheable)
+        if cached is not None:
+            return cached
+        query_vector = None
+        docs = self._lexical_docs(message)
+        if docs is None:
+            query_vector = self.embeddings.embed_query(message)
+            cached = self._cached_answer(message, cacheable, query_vector)
+            if cached is not None:
+                return cached
+            docs = self.retrieve(message, query_vector)
+        context = self._join_context(docs)
+        self.logger.info(f"[RAG] Context used for answer: {context[:500]}...")
+        if not context.strip():
+            self.logger.warning("[RAG] No relevant context found for query.")
+            return NO_CONTEXT_REPLY
+        current_topic = self._current_topic(self._recent(conversation_history), docs, topic_state)
+        response = self.llm.invoke(self._answer_prompt(message, context, current_topic, lead_info, lead_state))
+        return self._finish_answer(message, response.content, query_vector, cacheable)
+
+    async def aanswer(self, message: str, conversation_history: List[str], lead_info: Dict[str, str], lead_state: str,
+                      topic_state: Optional[TopicState] = None) -> str:
+        self.logger.info(f"[RAG] Answering message: {message}")
+        cacheable = self._cacheable(message, conversation_history, lead_info)
+        cached = self._cached_answer(message, cacheable)
+        if cached is not None:
+            return cached
+        query_vector = None
+        docs = self._lexical_docs(message)
+        if docs is None:
+            query_vector = await self.embeddings.aembed_query(message)
+            cached = self._cached_answer(message, cacheable, query_vector)
+            if cached is not None:
+                return cached
+            docs = await self.aretrieve(message, query_vector)
+        context = self._join_context(docs)
+        self.logger.info(f"[RAG] Context used for answer: {context[:500]}...")
+        if not context.strip():
+            self.logger.warning("[RAG] No relevant context found for query.")
+            return NO_CONTEXT_REPLY
+        current_topic = await self._acurrent_topic(self._recent(conversation_history), docs, topic_state)
+        response = await self.llm.ainvoke(self._answer_prompt(message, context, current_topic, lead_info, lead_state))
+        return self._finish_answer(message, response.content, query_vector, cacheable)
+
+    def stream_answer(self, message: str, conversation_history: List[str], lead_info: Dict[str, str], lead_state: str,
+                      topic_state: Optional[TopicState] = None) -> Iterator[str]:
+        """Like answer(), but yields the completion as it is generated. Cached and canned replies come as one piece."""
+        self.logger.info(f"[RAG] Streaming answer for message: {message}")
+        cacheable = self._cacheable(message, conversation_history, lead_info)
+        cached = self._cached_answer(message, cacheable)
+        if cached is not None:
+            yield cached
+            return
+        query_vector = None
+        docs = self._lexical_docs(message)
+        if docs is None:
+            query_vector = self.embeddings.embed_query(message)
+            cached = self._cached_answer(message, cacheable, query_vector)
+            if cached is not None:
+                yield cached
+                return
+            docs = self.retrieve(message, query_vector)
+        context = self._join_context(docs)
+        if not context.strip():
+            self.logger.warning("[RAG] No relevant context found for query.")
+            yield NO_CONTEXT_REPLY
+            return
+        current_topic = self._current_topic(self._recent(conversation_history), docs, topic_state)
+        parts = []
+        for chunk in self.llm.stream(self._answer_prompt(message, context, current_topic, lead_info, lead_state)):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        self._finish_answer(message, "".join(parts), query_vector, cacheable)
+
+    async def astream_answer(self, message: str, conversation_history: List[str], lead_info: Dict[str, str], lead_state: str,
+                             topic_state: Optional[TopicState] = None) -> AsyncIterator[str]:
+        self.logger.info(f"[RAG] Streaming answer for message: {message}")
+        cacheable = self._cacheable(message, conversation_history, lead_info)
+        cached = self._cached_answer(message, cacheable)
+        if cached is not None:
+            yield cached
+            return
+        query_vector = None
+        docs = self._lexical_docs(message)
+        if docs is None:
+            query_vector = await self.embeddings.aembed_query(message)
+            cached = self._cached_answer(message, cacheable, query_vector)
+            if cached is not None:
+                yield cached
+                return
+            docs = await self.aretrieve(message, query_vector)
+        context = self._join_context(docs)
+        if not context.strip():
+            self.logger.warning("[RAG] No relevant context found for query.")
+            yield NO_CONTEXT_REPLY
+            return
+        current_topic = await self._acurrent_topic(self._recent(conversation_history), docs, topic_state)
+        parts = []
+        async for chunk in self.llm.astream(self._answer_prompt(message, context, current_topic, lead_info, lead_state)):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        self._finish_answer(message, "".join(parts), query_vector, cacheable)
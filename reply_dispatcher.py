@@ -0,0 +1,95 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+class DeferredReplyDispatcher:
+    """Bounded asyncio worker pool that computes slow replies off the webhook path.
+
+    ``handler(user, body)`` produces the reply text and ``sender(user, text)``
+    delivers it (a blocking call, run in a thread). ``submit`` never blocks: it
+    returns False when the queue is full so the caller can answer inline instead.
+    """
+    def __init__(self, handler: Callable[[str, str], Awaitable[str]], sender: Callable[[str, str], None],
+                 workers: int = 8, max_queue: int = 1000):
+        self.logger = logging.getLogger("reply_dispatcher")
+        log_handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        log_handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(log_handler)
+        self.logger.setLevel(logging.INFO)
+        self.handler = handler
+        self.sender = sender
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._latencies = deque(maxlen=500)
+        self.submitted = 0
+        self.rejected = 0
+        self.delivered = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self.logger.info(f"Started {self.workers} reply workers (queue size {self.max_queue})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, user: str, body: str) -> bool:
+        if not self._tasks:
+            return False
+        try:
+            self._queue.put_nowait((user, body, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            self.logger.warning(f"Reply queue full, answering {user} inline")
+            return False
+        self.submitted += 1
+        return True
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            user, body, enqueued = await self._queue.get()
+            try:
+                text = await self.handler(user, body)
+                await asyncio.to_thread(self.sender, user, text)
+                self.delivered += 1
+                self._latencies.append(time.monotonic() - enqueued)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"Worker {worker_id} failed to deliver reply to {user}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None,
+        }
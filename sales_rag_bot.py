@@ -1,124 +1,317 @@
 import os
-from typing import Dict, Any
+import json
+import asyncio
+from typing import AsyncIterator, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from lead_state import LeadState
 from lead_tool import LeadTool
 from meeting_tool import MeetingTool
 from pdf_qa_tool import PDFQATool
+from topic_tracker import TopicState
+from conversation_memory import ConversationMemory
+from lead_extractor import looks_like_contact_info
+from intent_router import IntentRouter, GREETING, OFF_TOPIC, GREETING_REPLY, OFF_TOPIC_REPLY
+from salesforce_api import SalesforceAPI
+from salesforce_outbox import SalesforceOutbox
 
-class SalesRAGAgent:
+REFUSAL_MARKER = "Sorry, I can only answer questions"
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """Serialize a stream()/astream() event as a Server-Sent Events frame."""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+class SalesRAGEngine:
+    """Heavy, read-only resources shared by every conversation in the process."""
     def __init__(self, pdf_path: str):
         load_dotenv()
         if not os.getenv('OPENAI_API_KEY'):
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         os.environ["OPENAI_API_KEY"] = os.getenv('OPENAI_API_KEY')
         self.llm = ChatOpenAI(model="gpt-4o-mini")
-        self.lead_tool = LeadTool()
-        self.meeting_tool = MeetingTool(self.lead_tool.salesforce)
+        self.salesforce = SalesforceAPI()
+        # Lead/Event writes are recorded locally and flushed in the background (SF_WRITE_BEHIND=0 to disable).
+        self.outbox = None
+        if os.getenv("SF_WRITE_BEHIND", "1") == "1":
+            self.outbox = SalesforceOutbox(self.salesforce, path=os.getenv("SF_OUTBOX_PATH", "salesforce_outbox.db"))
+            self.outbox.start()
         self.pdf_qa_tool = PDFQATool(pdf_path)
-        self.conversation_history = []
+        # Local greeting/off-topic/knowledge router in front of NO_INTEREST turns (INTENT_ROUTER=0 to disable).
+        self.intent_router = IntentRouter() if os.getenv("INTENT_ROUTER", "1") == "1" else None
+
+class SalesRAGAgent:
+    """Per-conversation state on top of a shared SalesRAGEngine."""
+    def __init__(self, pdf_path: Optional[str] = None, engine: Optional[SalesRAGEngine] = None):
+        if engine is None:
+            if pdf_path is None:
+                raise ValueError("Either pdf_path or engine must be provided")
+            engine = SalesRAGEngine(pdf_path)
+        self.engine = engine
+        self.llm = engine.llm
+        self.pdf_qa_tool = engine.pdf_qa_tool
+        self.intent_router = engine.intent_router
+        self.lead_tool = LeadTool(engine.salesforce, engine.outbox)
+        self.meeting_tool = MeetingTool(engine.salesforce, engine.outbox)
+        self.memory = ConversationMemory()
+        self.topic_state = TopicState()
+        # Serializes concurrent aprocess() calls for the same conversation.
+        self._turn_lock = asyncio.Lock()
+
+    @property
+    def conversation_history(self):
+        return self.memory.turns()
+
+    def _is_contact_info(self, msg: str) -> bool:
+        return looks_like_contact_info(msg)
+
+    def _smalltalk_prompt(self, message: str) -> str:
+        system_prompt = (
+            "You are a friendly, conversational sales assistant for ServiceZone UAE or ServiceZone. "
+            "If the user greets you or starts with small talk (like 'hi', 'hello', 'how are you', etc.), "
+            "respond warmly and conversationally, and guide them to ask about ServiceZone UAE Group,location,working culture,Working style,project Type,Property, meetings, or services or ServiceZone"
+            "If the user's question is not related to ServiceZone, politely respond: 'Sorry, I can only answer questions related to ServiceZone UAE Property, meetings, or our services. Please ask something related.' "
+            "Never answer general knowledge or unrelated questions."
+        )
+        return f"""
+{system_prompt}
+
+Conversation so far:
+{chr(10).join(self.memory.recent(6))}
+Human: {message}
+Assistant:"
+"""
+
+    def _local_reply(self, message: str) -> Optional[str]:
+        """Canned reply for greetings and off-topic messages, or None for knowledge questions."""
+        if self.intent_router is None:
+            return None
+        intent = self.intent_router.route(message)
+        if intent == GREETING:
+            return GREETING_REPLY
+        if intent == OFF_TOPIC:
+            return OFF_TOPIC_REPLY
+        return None
+
+    def _rag_args(self, message: str, state: LeadState):
+        return (message, self.memory.recent(4), self.lead_tool.partial_lead_info, state.value, self.topic_state)
+
+    def _missing_reply(self, missing) -> str:
+        if missing:
+            if len(missing) == 1:
+                return f"Just need your {missing[0]} to get started."
+            return f"Just need your {', '.join(missing)} to get started."
+        return "Thanks!"
+
+    def _missing_suffix(self, state: LeadState, missing) -> str:
+        if not missing:
+            return ""
+        if state == LeadState.INTEREST_DETECTED:
+            return f"\n\nCould you share your {', '.join(missing)}?"
+        return f"\n\nJust need your {', '.join(missing)} to get started."
+
+    def _lead_saved_reply(self, lead_id) -> str:
+        if lead_id:
+            return "Great! I've saved your information.\nDo you want to schedule a meeting with our team? (Yes/No)"
+        return "Sorry, I had trouble saving your information. Would you mind trying again?"
+
+    def _wants_slots(self, message: str) -> bool:
+        return message.strip().lower() in []
+
+    def _slots_reply(self, slots) -> str:
+        if slots:
+            self.lead_tool.state = LeadState.WAITING_MEETING_SLOT_SELECTION
+            return f"Here are the available meeting slots for today:\n{self.meeting_tool.format_slots(slots)}\nPlease pick one."
+        self.lead_tool.state = LeadState.NO_INTEREST
+        return "Sorry, I couldn’t fetch available meeting slots right now."
+
+    def _declined_meeting_reply(self) -> str:
+        self.lead_tool.state = LeadState.NO_INTEREST
+        return "No problem! Let me know if you have any other questions."
+
+    def _bookable_slot(self, message: str):
+        slot = self._normalize_time(message)
+        if slot in self.meeting_tool.available_slots and self.lead_tool.current_lead_id:
+            return slot
+        return None
+
+    def _scheduled_reply(self, slot: str, success: bool) -> str:
+        self.lead_tool.state = LeadState.NO_INTEREST
+        self.meeting_tool.available_slots = []
+        self.lead_tool.current_lead_id = None
+        if success:
+            return f"✅ Your meeting has been scheduled at {slot}. Our team will contact you soon!"
+        return f"❌ Something went wrong while scheduling your meeting at {slot}. Please try again."
+
+    def _invalid_slot_reply(self, message: str) -> str:
+        return f"⚠️ '{message}' is not a valid time. Please choose from: {', '.join(self.meeting_tool.available_slots)}"
+
+    def _finish_turn(self, response: str) -> Dict[str, Any]:
+        self.memory.append(f"Assistant: {response}")
+        return {"response": response, "lead_info": self.lead_tool.partial_lead_info if self.lead_tool.partial_lead_info else None, "lead_state": self.lead_tool.state.value}
+
+    def _lead_flow_reply(self, message: str, state: LeadState) -> str:
+        """Reply for the lead-saving and meeting-booking states."""
+        if state == LeadState.INFO_COMPLETE:
+            return self._lead_saved_reply(self.lead_tool.create_lead())
+        if state == LeadState.AWAITING_MEETING_CONFIRMATION:
+            if self._wants_slots(message):
+                return self._slots_reply(self.meeting_tool.get_slots())
+            return self._declined_meeting_reply()
+        if state == LeadState.WAITING_MEETING_SLOT_SELECTION:
+            slot = self._bookable_slot(message)
+            if slot:
+                return self._scheduled_reply(slot, self.meeting_tool.schedule(self.lead_tool.current_lead_id, slot))
+            return self._invalid_slot_reply(message)
+        return ""
+
+    async def _alead_flow_reply(self, message: str, state: LeadState) -> str:
+        if state == LeadState.INFO_COMPLETE:
+            return self._lead_saved_reply(await self.lead_tool.acreate_lead())
+        if state == LeadState.AWAITING_MEETING_CONFIRMATION:
+            if self._wants_slots(message):
+                return self._slots_reply(await self.meeting_tool.aget_slots())
+            return self._declined_meeting_reply()
+        if state == LeadState.WAITING_MEETING_SLOT_SELECTION:
+            slot = self._bookable_slot(message)
+            if slot:
+                return self._scheduled_reply(slot, await self.meeting_tool.aschedule(self.lead_tool.current_lead_id, slot))
+            return self._invalid_slot_reply(message)
+        return ""
 
     def process(self, message: str) -> Dict[str, Any]:
         self.lead_tool.update_state(message, self.llm)
-        self.conversation_history.append(f"Human: {message}")
+        self.memory.compact(self.llm)
+        self.memory.append(f"Human: {message}")
         state = self.lead_tool.state
         response = ""
-        def is_contact_info(msg):
-            import re
-            phone_pattern = r"\\b\\d{10,}\\b"
-            email_pattern = r"[\\w\\.-]+@[\\w\\.-]+"
-            name_keywords = ["name is", "i am", "i'm", "this is"]
-            msg_lower = msg.lower()
-            if re.search(phone_pattern, msg) or re.search(email_pattern, msg):
-                return True
-            if any(kw in msg_lower for kw in name_keywords):
-                return True
-            return False
         if state == LeadState.NO_INTEREST:
-            rag_response = self.pdf_qa_tool.answer(message, self.conversation_history, self.lead_tool.partial_lead_info, state.value)
-            if "Sorry, I can only answer questions" not in rag_response:
+            response = self._local_reply(message)
+            if response is not None:
+                return self._finish_turn(response)
+            rag_response = self.pdf_qa_tool.answer(*self._rag_args(message, state))
+            # With the router on, the message was already judged on-topic; a refusal is final.
+            if self.intent_router is not None or REFUSAL_MARKER not in rag_response:
                 response = rag_response
             else:
                 # fallback to LLM intent/greeting detection
-                system_prompt = (
-                    "You are a friendly, conversational sales assistant for ServiceZone UAE or ServiceZone. "
-                    "If the user greets you or starts with small talk (like 'hi', 'hello', 'how are you', etc.), "
-                    "respond warmly and conversationally, and guide them to ask about ServiceZone UAE Group,location,working culture,Working style,project Type,Property, meetings, or services or ServiceZone"
-                    "If the user's question is not related to ServiceZone, politely respond: 'Sorry, I can only answer questions related to ServiceZone UAE Property, meetings, or our services. Please ask something related.' "
-                    "Never answer general knowledge or unrelated questions."
-                )
-                prompt = f"""
-{system_prompt}
-
-Conversation so far:
-{chr(10).join(self.conversation_history[-6:])}
-Human: {message}
-Assistant:"
-"""
-                response = self.llm.invoke(prompt).content
-        elif state == LeadState.INTEREST_DETECTED:
+                response = self.llm.invoke(self._smalltalk_prompt(message)).content
+        elif state in (LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO):
             missing = self.lead_tool.get_missing_fields()
-            if is_contact_info(message):
-                if missing:
-                    if len(missing) == 1:
-                        response = f"Just need your {missing[0]} to get started."
-                    else:
-                        response = f"Just need your {', '.join(missing)} to get started."
-                else:
-                    response = "Thanks!"
+            if self._is_contact_info(message):
+                response = self._missing_reply(missing)
             else:
-                response = self.pdf_qa_tool.answer(message, self.conversation_history, self.lead_tool.partial_lead_info, state.value)
-                if missing:
-                    response += f"\n\nCould you share your {', '.join(missing)}?"
-        elif state == LeadState.COLLECTING_INFO:
-            missing = self.lead_tool.get_missing_fields()
-            if is_contact_info(message):
-                if missing:
-                    if len(missing) == 1:
-                        response = f"Just need your {missing[0]} to get started."
-                    else:
-                        response = f"Just need your {', '.join(missing)} to get started."
+                response = self.pdf_qa_tool.answer(*self._rag_args(message, state)) + self._missing_suffix(state, missing)
+        else:
+            response = self._lead_flow_reply(message, state)
+        return self._finish_turn(response)
+
+    async def aprocess(self, message: str) -> Dict[str, Any]:
+        """Async twin of process(): LLM, embedding and Salesforce calls never block the event loop."""
+        async with self._turn_lock:
+            await self.lead_tool.aupdate_state(message, self.llm)
+            await self.memory.acompact(self.llm)
+            self.memory.append(f"Human: {message}")
+            state = self.lead_tool.state
+            response = ""
+            if state == LeadState.NO_INTEREST:
+                response = self._local_reply(message)
+                if response is not None:
+                    return self._finish_turn(response)
+                rag_response = await self.pdf_qa_tool.aanswer(*self._rag_args(message, state))
+                if self.intent_router is not None or REFUSAL_MARKER not in rag_response:
+                    response = rag_response
+                else:
+                    response = (await self.llm.ainvoke(self._smalltalk_prompt(message))).content
+            elif state in (LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO):
+                missing = self.lead_tool.get_missing_fields()
+                if self._is_contact_info(message):
+                    response = self._missing_reply(missing)
                 else:
-                    response = "Thanks!"
+                    response = await self.pdf_qa_tool.aanswer(*self._rag_args(message, state)) + self._missing_suffix(state, missing)
             else:
-                response = self.pdf_qa_tool.answer(message, self.conversation_history, self.lead_tool.partial_lead_info, state.value)
-                if missing:
-                    response += f"\n\nJust need your {', '.join(missing)} to get started."
-        elif state == LeadState.INFO_COMPLETE:
-            lead_id = self.lead_tool.create_lead()
-            if lead_id:
-                response = "Great! I've saved your information.\nDo you want to schedule a meeting with our team? (Yes/No)"
+                response = await self._alead_flow_reply(message, state)
+            return self._finish_turn(response)
+
+    def _stream_reply(self, message: str, state: LeadState) -> Iterator[str]:
+        if state == LeadState.NO_INTEREST:
+            response = self._local_reply(message)
+            if response is not None:
+                yield response
+            elif self.intent_router is not None:
+                yield from self.pdf_qa_tool.stream_answer(*self._rag_args(message, state))
             else:
-                response = "Sorry, I had trouble saving your information. Would you mind trying again?"
-        elif state == LeadState.AWAITING_MEETING_CONFIRMATION:
-            if message.strip().lower() in []:
-                slots = self.meeting_tool.get_slots()
-                if slots:
-                    response = f"Here are the available meeting slots for today:\n{self.meeting_tool.format_slots(slots)}\nPlease pick one."
-                    self.lead_tool.state = LeadState.WAITING_MEETING_SLOT_SELECTION
+                # Without the router a refusal can only be spotted on the full answer, so that one is not streamed.
+                rag_response = self.pdf_qa_tool.answer(*self._rag_args(message, state))
+                if REFUSAL_MARKER not in rag_response:
+                    yield rag_response
                 else:
-                    response = "Sorry, I couldn’t fetch available meeting slots right now."
-                    self.lead_tool.state = LeadState.NO_INTEREST
+                    for chunk in self.llm.stream(self._smalltalk_prompt(message)):
+                        yield chunk.content
+        elif state in (LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO):
+            missing = self.lead_tool.get_missing_fields()
+            if self._is_contact_info(message):
+                yield self._missing_reply(missing)
+            else:
+                yield from self.pdf_qa_tool.stream_answer(*self._rag_args(message, state))
+                yield self._missing_suffix(state, missing)
+        else:
+            yield self._lead_flow_reply(message, state)
+
+    async def _astream_reply(self, message: str, state: LeadState) -> AsyncIterator[str]:
+        if state == LeadState.NO_INTEREST:
+            response = self._local_reply(message)
+            if response is not None:
+                yield response
+            elif self.intent_router is not None:
+                async for text in self.pdf_qa_tool.astream_answer(*self._rag_args(message, state)):
+                    yield text
             else:
-                response = "No problem! Let me know if you have any other questions."
-                self.lead_tool.state = LeadState.NO_INTEREST
-        elif state == LeadState.WAITING_MEETING_SLOT_SELECTION:
-            slot = self._normalize_time(message)
-            if slot in self.meeting_tool.available_slots and self.lead_tool.current_lead_id:
-                success = self.meeting_tool.schedule(self.lead_tool.current_lead_id, slot)
-                if success:
-                    response = f"✅ Your meeting has been scheduled at {slot}. Our team will contact you soon!"
+                rag_response = await self.pdf_qa_tool.aanswer(*self._rag_args(message, state))
+                if REFUSAL_MARKER not in rag_response:
+                    yield rag_response
                 else:
-                    response = f"❌ Something went wrong while scheduling your meeting at {slot}. Please try again."
-                self.lead_tool.state = LeadState.NO_INTEREST
-                self.meeting_tool.available_slots = []
-                self.lead_tool.current_lead_id = None
+                    async for chunk in self.llm.astream(self._smalltalk_prompt(message)):
+                        yield chunk.content
+        elif state in (LeadState.INTEREST_DETECTED, LeadState.COLLECTING_INFO):
+            missing = self.lead_tool.get_missing_fields()
+            if self._is_contact_info(message):
+                yield self._missing_reply(missing)
             else:
-                response = f"⚠️ '{message}' is not a valid time. Please choose from: {', '.join(self.meeting_tool.available_slots)}"
-        self.conversation_history.append(f"Assistant: {response}")
-        self.conversation_history = self.conversation_history[-30:]
-        return {"response": response, "lead_info": self.lead_tool.partial_lead_info if self.lead_tool.partial_lead_info else None, "lead_state": self.lead_tool.state.value}
+                async for text in self.pdf_qa_tool.astream_answer(*self._rag_args(message, state)):
+                    yield text
+                yield self._missing_suffix(state, missing)
+        else:
+            yield await self._alead_flow_reply(message, state)
+
+    def stream(self, message: str) -> Iterator[Dict[str, Any]]:
+        """Streaming twin of process().
+
+        Yields ``{"event": "token", "data": text}`` as the reply is generated,
+        then one ``{"event": "state", "data": result}`` with the same dict
+        process() returns (response, lead_info, lead_state).
+        """
+        self.lead_tool.update_state(message, self.llm)
+        self.memory.compact(self.llm)
+        self.memory.append(f"Human: {message}")
+        parts = []
+        for text in self._stream_reply(message, self.lead_tool.state):
+            if text:
+                parts.append(text)
+                yield {"event": "token", "data": text}
+        yield {"event": "state", "data": self._finish_turn("".join(parts))}
+
+    async def astream(self, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Async twin of stream(); holds the conversation's turn lock until the state event is sent."""
+        async with self._turn_lock:
+            await self.lead_tool.aupdate_state(message, self.llm)
+            await self.memory.acompact(self.llm)
+            self.memory.append(f"Human: {message}")
+            parts = []
+            async for text in self._astream_reply(message, self.lead_tool.state):
+                if text:
+                    parts.append(text)
+                    yield {"event": "token", "data": text}
+            yield {"event": "state", "data": self._finish_turn("".join(parts))}
 
     def _normalize_time(self, message: str) -> str:
         parsed_time = message.strip().lower().replace("\"", "").replace("'", "").replace(" ", "").replace(".", "")
@@ -1,9 +1,8 @@
 import streamlit as st
 import uuid
-from datetime import datetime
-import json
 import os
-from main import SalesRAGAgent
+from sales_rag_bot import SalesRAGAgent, SalesRAGEngine
+from transcript_store import TranscriptStore
 import logging
 
 logging.basicConfig(
@@ -19,41 +18,36 @@ if 'chatbot' not in st.session_state:
     st.session_state.chatbot = None
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-if 'chat_file' not in st.session_state:
-    st.session_state.chat_file = None
+
+@st.cache_resource(show_spinner="Loading knowledge base...")
+def get_engine() -> SalesRAGEngine:
+    """Process-wide engine (PDF index, LLM clients, Salesforce); built once and shared by every session."""
+    logger.info("Initializing shared SalesRAGEngine")
+    return SalesRAGEngine(os.getenv("KNOWLEDGE_BASE", 'ServiceZoneUAE.pdf'))
 
 def initialize_chatbot():
     """Initialize the chatbot for the current session."""
     if st.session_state.chatbot is None:
         try:
-            st.session_state.chatbot = SalesRAGAgent('ServiceZoneUAE.pdf') 
+            st.session_state.chatbot = SalesRAGAgent(engine=get_engine())
             logger.info(f"Chatbot initialized for session {st.session_state.session_id}")
         except Exception as e:
             logger.error(f"Error initializing chatbot: {str(e)}")
             st.error("Failed to initialize chatbot. Please try again later.")
 
-def save_chat_history():
-    """Save chat history to a file."""
+@st.cache_resource
+def get_transcripts() -> TranscriptStore:
+    """Process-wide append-only transcript log, indexed by session id."""
+    store = TranscriptStore(os.getenv("TRANSCRIPT_DIR", "chat_history/streamlit"))
+    store.start()
+    return store
+
+def save_turn(role: str, content: str, **meta):
+    """Append one message to the session's transcript (queued; fsynced in batches)."""
     try:
-        # Create chat_history directory if it doesn't exist
-        os.makedirs("chat_history", exist_ok=True)
-        
-        if st.session_state.chat_file is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            st.session_state.chat_file = f"chat_history/chat_{st.session_state.session_id}_{timestamp}.json"
-        
-        chat_data = {
-            "session_id": st.session_state.session_id,
-            "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "messages": st.session_state.messages
-        }
-        
-        with open(st.session_state.chat_file, "w") as f:
-            json.dump(chat_data, f, indent=2)
-            
-        logger.info(f"Chat history updated for session {st.session_state.session_id}")
+        get_transcripts().append(st.session_state.session_id, role, content, channel="streamlit", **meta)
     except Exception as e:
-        logger.error(f"Error saving chat history: {str(e)}")
+        logger.error(f"Error saving chat turn: {str(e)}")
 
 def main():
     st.set_page_config(
@@ -127,21 +121,28 @@ def main():
     if prompt := st.chat_input("Type your message here..."):
         # Add user message immediately and display
         st.session_state.messages.append({"role": "user", "content": prompt})
+        save_turn("user", prompt)
         with chat_container:
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-        # Show spinner while processing response
+        # Render the reply token by token as it is generated
         if st.session_state.chatbot:
-            with st.spinner("🤖 Bot is thinking..."):
-                response = st.session_state.chatbot.process(prompt)
+            response = {}
+
+            def tokens():
+                for event in st.session_state.chatbot.stream(prompt):
+                    if event["event"] == "token":
+                        yield event["data"]
+                    else:
+                        response.update(event["data"])
 
-            st.session_state.messages.append({"role": "assistant", "content": response['response']})
             with chat_container:
                 with st.chat_message("assistant"):
-                    st.markdown(response['response'])
+                    st.write_stream(tokens())
 
-            save_chat_history()
+            st.session_state.messages.append({"role": "assistant", "content": response['response']})
+            save_turn("assistant", response['response'], lead_state=response['lead_state'])
 
             # Rerun to update the UI
             # st.rerun()
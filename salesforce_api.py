@@ -1,11 +1,32 @@
 import os
+import time
+import random
+import asyncio
 import logging
+import threading
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
+from urllib.parse import quote_plus
 import pytz
+from availability import AvailabilityEngine, make_availability_engine
+
+API_VERSION = "v60.0"
+# Statuses worth retrying for idempotent methods: throttling and gateway/availability errors.
+RETRY_STATUSES = {429, 502, 503, 504}
+# A retried POST may create a second record, so only errors raised before the
+# request reached Salesforce (and 429, which means it was not processed) are
+# retried for methods outside this set.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+UNSENT_ERRORS = (requests.ConnectionError, requests.ConnectTimeout)
+AUNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
 
 class SalesforceAPI:
-    def __init__(self):
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.5, max_backoff: float = 8.0, timeout: float = 30,
+                 pool_size: int = 20, token_ttl: float = 2 * 3600, refresh_margin: float = 300,
+                 background_refresh: bool = True, advisor_id: str = None, availability_ttl: float = 60,
+                 availability: AvailabilityEngine = None):
         self.logger = logging.getLogger("salesforce_api")
         handler = logging.StreamHandler()
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -18,52 +39,393 @@ class SalesforceAPI:
         self.client_secret = os.getenv("SF_CLIENT_SECRET")
         self.access_token = None
         self.instance_url = None
-        self._authenticate()
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # Keep-alive pool shared by every sync call; avoids a TCP+TLS handshake per request.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._async_client = None
+        # Authentication is lazy: nothing talks to Salesforce until the first call
+        # needs a token. After that a daemon thread renews it before it expires.
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self.token_expires_at = 0.0
+        self._auth_lock = threading.Lock()
+        # Async callers: one coroutine re-authenticates, the others wait and reuse its token.
+        self._aauth_lock = asyncio.Lock()
+        self._refresh_thread = None
+        # Advisor whose calendar is offered and booked (Event.OwnerId).
+        self.advisor_id = advisor_id or os.getenv("SF_ADVISOR_ID", "0055i000004KEluAAG")
+        # All advisors considered by next_available_slots (comma-separated OwnerIds).
+        self.advisor_ids = [a.strip() for a in os.getenv("SF_ADVISOR_IDS", self.advisor_id).split(",") if a.strip()]
+        self.availability = availability or make_availability_engine()
+        # (owner_id, day) -> (busy bitmap, fetched_at); patched locally on booking.
+        self.availability_ttl = availability_ttl
+        self._availability = {}
+        self._availability_lock = threading.Lock()
+        self.availability_hits = 0
+        self.availability_misses = 0
+
+    def _auth_data(self):
+        return {"grant_type": "client_credentials", "client_id": self.client_id, "client_secret": self.client_secret}
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"}
+
+    def _store_token(self, data):
+        self.access_token = data.get("access_token")
+        self.instance_url = data.get("instance_url")
+        # Client-credentials responses usually omit expires_in; fall back to the org session timeout.
+        self.token_expires_at = time.time() + float(data.get("expires_in") or self.token_ttl)
+        self.logger.info("Salesforce authentication successful.")
+        self._start_refresh_thread()
+
+    def _token_valid(self):
+        return bool(self.access_token and self.instance_url) and time.time() < self.token_expires_at - self.refresh_margin
+
+    def _ensure_token(self):
+        if self._token_valid():
+            return
+        with self._auth_lock:
+            if not self._token_valid():
+                self._authenticate()
+
+    async def _aensure_token(self):
+        if self._token_valid():
+            return
+        async with self._aauth_lock:
+            if not self._token_valid():
+                await self._aauthenticate()
+
+    @property
+    def authenticated(self):
+        return self._token_valid()
+
+    def _start_refresh_thread(self):
+        if not self.background_refresh or (self._refresh_thread is not None and self._refresh_thread.is_alive()):
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="salesforce-token-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(max(1.0, self.token_expires_at - self.refresh_margin - time.time()))
+            try:
+                with self._auth_lock:
+                    if not self._token_valid():
+                        self._authenticate()
+            except Exception:
+                # Already logged by _authenticate; the next call will retry lazily too.
+                self.token_expires_at = time.time() + self.refresh_margin + 30
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._async_client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
 
     def _authenticate(self):
         self.logger.info("Authenticating with Salesforce...Govind 123")
         try:
-            auth_data = {"grant_type": "client_credentials", "client_id": self.client_id, "client_secret": self.client_secret}
-            response = requests.post(self.auth_url, data=auth_data)
+            response = self.session.post(self.auth_url, data=self._auth_data(), timeout=self.timeout)
             response.raise_for_status()
-            data = response.json()
-            self.access_token = data.get("access_token")
-            self.instance_url = data.get("instance_url")
-            self.logger.info("Salesforce authentication successful.")
+            self._store_token(response.json())
         except Exception as e:
             self.logger.error(f"Salesforce authentication failed: {str(e)}")
             raise
 
+    async def _aauthenticate(self):
+        self.logger.info("Authenticating with Salesforce (async)...")
+        try:
+            response = await self._get_async_client().post(self.auth_url, data=self._auth_data())
+            response.raise_for_status()
+            self._store_token(response.json())
+        except Exception as e:
+            self.logger.error(f"Salesforce authentication failed: {str(e)}")
+            raise
+
+    # ---- Transport: pooled connections, bounded retries, re-auth on expired token
+
+    def _url(self, path):
+        return f"{self.instance_url}/services/data/{API_VERSION}/{path}"
+
+    def _is_auth_error(self, response):
+        return response.status_code == 401 or "INVALID_SESSION_ID" in response.text
+
+    def _retry_delay(self, attempt):
+        # Full jitter keeps many workers from retrying in lockstep.
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** (attempt - 1))))
+
+    def _retryable_status(self, method, status_code):
+        if method.upper() in IDEMPOTENT_METHODS:
+            return status_code in RETRY_STATUSES
+        return status_code == 429
+
+    def _log_call(self, method, path, status, started, attempt):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.logger.info(f"Salesforce {method} {path.split('?')[0]} -> {status} in {elapsed_ms:.0f} ms (attempt {attempt})")
+
+    def _request(self, method, path, **kwargs):
+        attempt = 0
+        reauthenticated = False
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self._url(path), headers=self._headers(), timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                self._log_call(method, path, type(e).__name__, started, attempt)
+                if attempt >= self.max_attempts or not (method.upper() in IDEMPOTENT_METHODS or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            self._log_call(method, path, response.status_code, started, attempt)
+            if self._is_auth_error(response) and not reauthenticated:
+                self.logger.info("Salesforce session expired, re-authenticating.")
+                with self._auth_lock:
+                    self._authenticate()
+                reauthenticated = True
+                attempt -= 1  # a token refresh does not use up a retry
+                continue
+            if self._retryable_status(method, response.status_code) and attempt < self.max_attempts:
+                time.sleep(self._retry_delay(attempt))
+                continue
+            return response
+
+    async def _arequest(self, method, path, **kwargs):
+        attempt = 0
+        reauthenticated = False
+        client = self._get_async_client()
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            token = self.access_token
+            try:
+                response = await client.request(method, self._url(path), headers=self._headers(), **kwargs)
+            except httpx.TransportError as e:
+                self._log_call(method, path, type(e).__name__, started, attempt)
+                if attempt >= self.max_attempts or not (method.upper() in IDEMPOTENT_METHODS or isinstance(e, AUNSENT_ERRORS)):
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            self._log_call(method, path, response.status_code, started, attempt)
+            if self._is_auth_error(response) and not reauthenticated:
+                self.logger.info("Salesforce session expired, re-authenticating.")
+                async with self._aauth_lock:
+                    if self.access_token == token:  # not already renewed by a concurrent call
+                        await self._aauthenticate()
+                reauthenticated = True
+                attempt -= 1
+                continue
+            if self._retryable_status(method, response.status_code) and attempt < self.max_attempts:
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            return response
+
+    # ---- Request/response helpers shared by the sync and async paths
+
+    def lead_payload(self, lead_info):
+        return {
+            "LastName": lead_info["Name"],
+            "Company": lead_info["Company"],
+            "Email": lead_info["Email"],
+            "Phone": lead_info["Phone"],
+            "Lead_Source__c":"Propfinder"
+        }
+
+    def _parse_lead_response(self, response):
+        if response.status_code == 201:
+            self.logger.info("Lead created successfully.")
+            return True, response.json().get("id")
+        elif response.status_code == 400 and "DUPLICATES_DETECTED" in response.text:
+            error_data = response.json()
+            match_records = (error_data[0].get("duplicateResult", {}).get("matchResults", [])[0].get("matchRecords", []))
+            if match_records:
+                self.logger.info("Duplicate lead detected, returning existing lead ID.")
+                return True, match_records[0]["record"]["Id"]
+        self.logger.error(f"Failed to create lead: {response.text}")
+        return False, None
+
+    def event_payload(self, lead_id, start_time_str, owner_id=None, day=None):
+        day = day or self._today()
+        index = self.availability.slot_index(start_time_str)
+        if index is not None:
+            start_local_dt = self.availability.slot_start(day, index)
+        else:
+            start_dt = datetime.strptime(start_time_str, "%H:%M")
+            start_local_dt = self.availability.tz.localize(datetime.combine(day, start_dt.time()))
+        start_utc_dt = start_local_dt.astimezone(pytz.utc)
+        end_utc_dt = start_utc_dt + self.availability.slot
+        return {
+            "Subject": "Call with Sales Advisor",
+            "StartDateTime": start_utc_dt.isoformat(),
+            "EndDateTime": end_utc_dt.isoformat(),
+            "OwnerId": owner_id or self.advisor_id,
+            "WhoId": lead_id,
+            "Location": "Virtual Call",
+            "Description": "Scheduled via Agentic Bot"
+        }
+
+    def _parse_meeting_response(self, response, start_time_str):
+        if response.status_code == 201:
+            self.logger.info("Meeting created successfully.")
+            self.mark_slot_booked(start_time_str)
+            return True
+        self.logger.error(f"Failed to create meeting: {response.text}")
+        return False
+
+    def _today(self):
+        return datetime.now(self.availability.tz).date()
+
+    def _events_path(self, owner_ids, start_day, end_day):
+        start_utc, end_utc = self.availability.utc_bounds(start_day, end_day)
+        owners = ",".join(f"'{owner}'" for owner in owner_ids)
+        soql = (f"SELECT OwnerId, StartDateTime, EndDateTime FROM Event WHERE OwnerId IN ({owners}) "
+                f"AND StartDateTime < {end_utc:%Y-%m-%dT%H:%M:%SZ} AND EndDateTime > {start_utc:%Y-%m-%dT%H:%M:%SZ}")
+        return f"query?q={quote_plus(soql)}"
+
+    def _next_records_path(self, data):
+        next_url = data.get("nextRecordsUrl")
+        return next_url.split(f"/services/data/{API_VERSION}/", 1)[1] if next_url else None
+
+    def _intervals_from_records(self, records):
+        intervals = []
+        for event in records:
+            try:
+                start = datetime.strptime(event["StartDateTime"], "%Y-%m-%dT%H:%M:%S.%f%z")
+                end = datetime.strptime(event["EndDateTime"], "%Y-%m-%dT%H:%M:%S.%f%z") if event.get("EndDateTime") else start
+                intervals.append((event["OwnerId"], start, end))
+            except Exception:
+                self.logger.warning(f"Could not parse event: {event}")
+        return intervals
+
+    def _query_events(self, owner_ids, start_day, end_day):
+        """One bulk Event query for all advisors and days (following pagination)."""
+        records, path = [], self._events_path(owner_ids, start_day, end_day)
+        while path:
+            response = self._request("GET", path)
+            if response.status_code != 200:
+                self.logger.error(f"Failed to fetch meeting slots: {response.text}")
+                return None
+            data = response.json()
+            records.extend(data.get("records", []))
+            path = self._next_records_path(data)
+        return self._intervals_from_records(records)
+
+    async def _aquery_events(self, owner_ids, start_day, end_day):
+        records, path = [], self._events_path(owner_ids, start_day, end_day)
+        while path:
+            response = await self._arequest("GET", path)
+            if response.status_code != 200:
+                self.logger.error(f"Failed to fetch meeting slots: {response.text}")
+                return None
+            data = response.json()
+            records.extend(data.get("records", []))
+            path = self._next_records_path(data)
+        return self._intervals_from_records(records)
+
+    # ---- Availability cache: (owner_id, day) -> (busy bitmap, fetched_at)
+
+    def _cached_masks(self, owner_ids, start_day, end_day):
+        now = time.monotonic()
+        keys = [(owner, day) for owner in owner_ids for day in self.availability.days(start_day, end_day)]
+        if not keys:
+            return {}  # no working day in the range: nothing to look up or fetch
+        with self._availability_lock:
+            entries = [self._availability.get(key) for key in keys]
+            if all(entry is not None and now - entry[1] < self.availability_ttl for entry in entries):
+                self.availability_hits += 1
+                return {key: entry[0] for key, entry in zip(keys, entries)}
+            self.availability_misses += 1
+            return None
+
+    def _store_masks(self, intervals, owner_ids, start_day, end_day):
+        masks = self.availability.busy_masks(intervals, start_day, end_day)
+        now = time.monotonic()
+        today = self._today()
+        with self._availability_lock:
+            # Past days are never asked for again.
+            self._availability = {k: v for k, v in self._availability.items() if k[1] >= today}
+            for owner in owner_ids:
+                for day in self.availability.days(start_day, end_day):
+                    self._availability[(owner, day)] = (masks.get((owner, day), 0), now)
+        return {(owner, day): masks.get((owner, day), 0) for owner in owner_ids for day in self.availability.days(start_day, end_day)}
+
+    def mark_slot_booked(self, start_time_str, owner_id=None, day=None):
+        """Record a booking locally so the next slot list excludes it without a query."""
+        index = self.availability.slot_index(start_time_str)
+        if index is None:
+            return
+        key = (owner_id or self.advisor_id, day or self._today())
+        with self._availability_lock:
+            entry = self._availability.get(key)
+            if entry is not None:
+                self._availability[key] = (entry[0] | (1 << index), entry[1])
+
+    def availability_stats(self):
+        lookups = self.availability_hits + self.availability_misses
+        return {"hits": self.availability_hits, "misses": self.availability_misses,
+                "hit_rate": self.availability_hits / lookups if lookups else 0.0, "ttl": self.availability_ttl}
+
+    def _busy(self, owner_ids, start_day, end_day):
+        masks = self._cached_masks(owner_ids, start_day, end_day)
+        if masks is not None:
+            return masks
+        self._ensure_token()
+        intervals = self._query_events(owner_ids, start_day, end_day)
+        return None if intervals is None else self._store_masks(intervals, owner_ids, start_day, end_day)
+
+    async def _abusy(self, owner_ids, start_day, end_day):
+        masks = self._cached_masks(owner_ids, start_day, end_day)
+        if masks is not None:
+            return masks
+        await self._aensure_token()
+        intervals = await self._aquery_events(owner_ids, start_day, end_day)
+        return None if intervals is None else self._store_masks(intervals, owner_ids, start_day, end_day)
+
+    def _today_labels(self, masks, today):
+        if not self.availability.is_working_day(today):
+            self.logger.info(f"{today} is not a working day; no slots available.")
+            return []
+        available_slots = self.availability.free_labels(masks.get((self.advisor_id, today), 0))
+        self.logger.info(f"Available slots: {available_slots}")
+        return available_slots
+
+    # ---- Public API
+
     def create_lead(self, lead_info):
         self.logger.info(f"Creating lead with info: {lead_info}")
         try:
-            if not self.access_token or not self.instance_url:
-                print("calling Create Lead Record")
-                self._authenticate()
+            self._ensure_token()
             if any(value == "N/A" for value in lead_info.values()):
                 self.logger.warning("Lead info contains 'N/A', aborting lead creation.")
                 return False, None
-            lead_url = f"{self.instance_url}/services/data/v60.0/sobjects/Lead/"
-            headers = {"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"}
-            sf_lead_payload = {
-                "LastName": lead_info["Name"],
-                "Company": lead_info["Company"],
-                "Email": lead_info["Email"],
-                "Phone": lead_info["Phone"],
-                "Lead_Source__c":"Propfinder"
-            }
-            response = requests.post(lead_url, headers=headers, json=sf_lead_payload)
-            if response.status_code == 201:
-                self.logger.info("Lead created successfully.")
-                return True, response.json().get("id")
-            elif response.status_code == 400 and "DUPLICATES_DETECTED" in response.text:
-                error_data = response.json()
-                match_records = (error_data[0].get("duplicateResult", {}).get("matchResults", [])[0].get("matchRecords", []))
-                if match_records:
-                    self.logger.info("Duplicate lead detected, returning existing lead ID.")
-                    return True, match_records[0]["record"]["Id"]
-            self.logger.error(f"Failed to create lead: {response.text}")
+            response = self._request("POST", "sobjects/Lead/", json=self.lead_payload(lead_info))
+            return self._parse_lead_response(response)
+        except Exception as e:
+            self.logger.error(f"Failed to create lead: {str(e)}")
             return False, None
+
+    async def acreate_lead(self, lead_info):
+        self.logger.info(f"Creating lead with info: {lead_info}")
+        try:
+            await self._aensure_token()
+            if any(value == "N/A" for value in lead_info.values()):
+                self.logger.warning("Lead info contains 'N/A', aborting lead creation.")
+                return False, None
+            response = await self._arequest("POST", "sobjects/Lead/", json=self.lead_payload(lead_info))
+            return self._parse_lead_response(response)
         except Exception as e:
             self.logger.error(f"Failed to create lead: {str(e)}")
             return False, None
@@ -71,72 +433,75 @@ class SalesforceAPI:
     def create_meeting(self, lead_id, start_time_str):
         self.logger.info(f"Creating meeting for lead_id={lead_id} at {start_time_str}")
         try:
-            if not self.access_token or not self.instance_url:
-                print("calling Create meeting")
-                self._authenticate()
-            event_url = f"{self.instance_url}/services/data/v60.0/sobjects/Event/"
-            headers = {"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"}
-            start_dt = datetime.strptime(start_time_str, "%H:%M")
-            ist = pytz.timezone('Asia/Kolkata')
-            today_local = datetime.now(ist).date()
-            start_local_dt = ist.localize(datetime.combine(today_local, start_dt.time()))
-            start_utc_dt = start_local_dt.astimezone(pytz.utc) + timedelta(hours=5) + timedelta(minutes=30)
-            end_utc_dt = start_utc_dt + timedelta(minutes=30)
-            event_payload = {
-                "Subject": "Call with Sales Advisor",
-                "StartDateTime": start_utc_dt.isoformat(),
-                "EndDateTime": end_utc_dt.isoformat(),
-                "OwnerId": "0055i000004KEluAAG",
-                "WhoId": lead_id,
-                "Location": "Virtual Call",
-                "Description": "Scheduled via Agentic Bot"
-            }
-            response = requests.post(event_url, headers=headers, json=event_payload)
-            if response.status_code == 201:
-                self.logger.info("Meeting created successfully.")
-                return True
-            else:
-                self.logger.error(f"Failed to create meeting: {response.text}")
-                return False
+            self._ensure_token()
+            response = self._request("POST", "sobjects/Event/", json=self.event_payload(lead_id, start_time_str))
+            return self._parse_meeting_response(response, start_time_str)
+        except Exception as e:
+            self.logger.error(f"Exception while creating meeting: {str(e)}")
+            return False
+
+    async def acreate_meeting(self, lead_id, start_time_str):
+        self.logger.info(f"Creating meeting for lead_id={lead_id} at {start_time_str}")
+        try:
+            await self._aensure_token()
+            response = await self._arequest("POST", "sobjects/Event/", json=self.event_payload(lead_id, start_time_str))
+            return self._parse_meeting_response(response, start_time_str)
         except Exception as e:
             self.logger.error(f"Exception while creating meeting: {str(e)}")
             return False
 
+    def create_records(self, records):
+        """Create up to 200 records in one sObject Collections call (allOrNone off).
+
+        Each record carries its own ``attributes.type``. Returns the per-record
+        results in order, or None when the call itself failed.
+        """
+        self._ensure_token()
+        response = self._request("POST", "composite/sobjects", json={"allOrNone": False, "records": records})
+        if response.status_code != 200:
+            self.logger.error(f"Composite create of {len(records)} records failed: {response.status_code} {response.text}")
+            return None
+        return response.json()
+
     def show_availableMeeting(self):
         self.logger.info("Fetching available meeting slots...")
-        start_times = set()
         try:
-            if not self.access_token or not self.instance_url:
-                print("calling show_availableMeeting")
-                self._authenticate()
-            event_url = f"{self.instance_url}/services/data/v60.0/query?q=SELECT+StartDateTime,+EndDateTime+FROM+Event+WHERE+StartDateTime+=+TODAY"
-            headers = {"Authorization": f"Bearer {self.access_token}", "Content-Type": "application/json"}
-            response = requests.get(event_url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                records = data.get("records", [])
-                fmt = "%H:%M"
-                start_time = datetime.strptime("08:00", fmt)
-                end_time = datetime.strptime("17:00", fmt)
-                all_slots = set()
-                current = start_time
-                while current < end_time:
-                    all_slots.add(current.strftime(fmt))
-                    current += timedelta(minutes=30)
-                for event in records:
-                    start = event.get("StartDateTime")
-                    if start:
-                        try:
-                            dt = datetime.strptime(start, "%Y-%m-%dT%H:%M:%S.%f%z")
-                            time_only = dt.strftime("%H:%M")
-                            start_times.add(time_only)
-                        except Exception:
-                            self.logger.warning(f"Could not parse event start time: {start}")
-                available_slots = sorted(all_slots - start_times)
-                self.logger.info(f"Available slots: {available_slots}")
-                return available_slots
-            self.logger.error(f"Failed to fetch meeting slots: {response.text}")
+            today = self._today()
+            masks = self._busy([self.advisor_id], today, today)
+            return [] if masks is None else self._today_labels(masks, today)
+        except Exception as e:
+            self.logger.error(f"Exception while showing meeting: {str(e)}")
             return []
+
+    async def ashow_availableMeeting(self):
+        self.logger.info("Fetching available meeting slots...")
+        try:
+            today = self._today()
+            masks = await self._abusy([self.advisor_id], today, today)
+            return [] if masks is None else self._today_labels(masks, today)
         except Exception as e:
             self.logger.error(f"Exception while showing meeting: {str(e)}")
             return []
+
+    def next_available_slots(self, count=3, days=7, owner_ids=None):
+        """Earliest ``count`` free (start, OwnerId) pairs across advisors within ``days`` days."""
+        owner_ids = owner_ids or self.advisor_ids
+        now = datetime.now(self.availability.tz)
+        end_day = now.date() + timedelta(days=days - 1)
+        try:
+            masks = self._busy(owner_ids, now.date(), end_day)
+            return [] if masks is None else self.availability.next_free(masks, owner_ids, count, now, end_day)
+        except Exception as e:
+            self.logger.error(f"Exception while finding next slots: {str(e)}")
+            return []
+
+    async def anext_available_slots(self, count=3, days=7, owner_ids=None):
+        owner_ids = owner_ids or self.advisor_ids
+        now = datetime.now(self.availability.tz)
+        end_day = now.date() + timedelta(days=days - 1)
+        try:
+            masks = await self._abusy(owner_ids, now.date(), end_day)
+            return [] if masks is None else self.availability.next_free(masks, owner_ids, count, now, end_day)
+        except Exception as e:
+            self.logger.error(f"Exception while finding next slots: {str(e)}")
+            return []
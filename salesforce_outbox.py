@@ -0,0 +1,245 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+from salesforce_api import SalesforceAPI
+
+LOCAL_REF_PREFIX = "outbox:"
+# sObject Collections accepts at most 200 records per request.
+MAX_BATCH = 200
+DEPENDENCY_DEAD = "dependency dead"
+
+class SalesforceOutbox:
+    """Durable write-behind queue for Lead and Event creates.
+
+    ``enqueue_lead`` / ``enqueue_event`` commit a row to SQLite and return at
+    once. A daemon thread drains pending rows in batches through the
+    sObject Collections API. Rows are deduplicated by a content key, and
+    failures are retried with exponential backoff up to ``max_attempts``,
+    after which the row is dead. Enqueueing a dead row again revives it.
+    Events may point at a lead that is still in the outbox; they wait until
+    that lead has a Salesforce Id, die with it and are revived with it. Several processes may drain the same
+    database: a batch is claimed (status ``sending``) in one write
+    transaction before it is sent, and claims older than ``claim_timeout``
+    seconds, left by a drainer that died mid-send, go back to pending.
+    """
+    def __init__(self, salesforce: SalesforceAPI, path: str = "salesforce_outbox.db", interval: float = 2.0,
+                 batch_size: int = MAX_BATCH, max_attempts: int = 8, backoff: float = 5.0,
+                 claim_timeout: float = 300.0):
+        self.logger = logging.getLogger("salesforce_outbox")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.salesforce = salesforce
+        self.path = path
+        self.interval = interval
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " dedup_key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL,"
+            " depends_on INTEGER,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL DEFAULT 0,"
+            " sf_id TEXT,"
+            " error TEXT,"
+            " claimed_at REAL,"
+            " created_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "claimed_at" not in columns:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at)")
+
+    # ---- Producer side
+
+    @staticmethod
+    def local_ref(row_id: int) -> str:
+        return f"{LOCAL_REF_PREFIX}{row_id}"
+
+    @staticmethod
+    def is_local_ref(lead_id: Optional[str]) -> bool:
+        return bool(lead_id) and lead_id.startswith(LOCAL_REF_PREFIX)
+
+    def _enqueue(self, kind: str, dedup_key: str, payload: Dict[str, Any], depends_on: Optional[int] = None) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO outbox (kind, dedup_key, payload, depends_on, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (kind, dedup_key, json.dumps(payload), depends_on, time.time()),
+                )
+                row_id, status = self._conn.execute("SELECT id, status FROM outbox WHERE dedup_key = ?", (dedup_key,)).fetchone()
+                if status == "dead":
+                    # A fresh request for a row that gave up: start its retries over, with the events that died with it.
+                    self._conn.execute(
+                        "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0, error = NULL "
+                        "WHERE id = ? OR (depends_on = ? AND status = 'dead' AND error = ?)",
+                        (row_id, row_id, DEPENDENCY_DEAD),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if status == "dead":
+            self.logger.info(f"Revived dead outbox row {row_id}")
+        self._wake.set()
+        return row_id
+
+    def enqueue_lead(self, lead_info: Dict[str, str]) -> str:
+        payload = self.salesforce.lead_payload(lead_info)
+        key = hashlib.sha256(f"lead|{payload['Email'].lower()}|{payload['Phone']}".encode()).hexdigest()
+        row_id = self._enqueue("Lead", key, payload)
+        self.logger.info(f"Queued lead {row_id} for {payload['Email']}")
+        return self.local_ref(row_id)
+
+    def enqueue_event(self, lead_id: str, start_time_str: str) -> int:
+        depends_on = None
+        if self.is_local_ref(lead_id):
+            depends_on = int(lead_id[len(LOCAL_REF_PREFIX):])
+            sf_id = self._sf_id(depends_on)
+            if sf_id:
+                lead_id, depends_on = sf_id, None
+        payload = self.salesforce.event_payload(None if depends_on else lead_id, start_time_str)
+        key = hashlib.sha256(f"event|{lead_id}|{payload['StartDateTime']}".encode()).hexdigest()
+        row_id = self._enqueue("Event", key, payload, depends_on)
+        self.logger.info(f"Queued event {row_id} for lead {lead_id} at {start_time_str}")
+        return row_id
+
+    def _sf_id(self, row_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT sf_id FROM outbox WHERE id = ?", (row_id,)).fetchone()
+        return row[0] if row else None
+
+    # ---- Drainer
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="salesforce-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                while self.drain_once():
+                    pass
+            except Exception as e:
+                self.logger.error(f"Outbox drain failed: {e}")
+
+    def _claim(self, kind: str) -> List[tuple]:
+        """Atomically move one batch of due rows from pending to sending and return them."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE outbox SET status = 'pending', claimed_at = NULL WHERE status = 'sending' AND claimed_at < ?",
+                    (now - self.claim_timeout,),
+                )
+                self._conn.execute(
+                    "UPDATE outbox SET status = 'dead', error = ? WHERE status = 'pending' "
+                    "AND depends_on IN (SELECT id FROM outbox WHERE status = 'dead')",
+                    (DEPENDENCY_DEAD,),
+                )
+                rows = self._conn.execute(
+                    "SELECT o.id, o.payload, l.sf_id FROM outbox o LEFT JOIN outbox l ON l.id = o.depends_on "
+                    "WHERE o.kind = ? AND o.status = 'pending' AND o.next_attempt_at <= ? "
+                    "AND (o.depends_on IS NULL OR l.sf_id IS NOT NULL) ORDER BY o.id LIMIT ?",
+                    (kind, now, self.batch_size),
+                ).fetchall()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE outbox SET status = 'sending', claimed_at = ? "
+                        f"WHERE id IN ({','.join('?' * len(rows))}) AND status = 'pending'",
+                        (now, *(row[0] for row in rows)),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def drain_once(self) -> int:
+        """Send one batch of due leads and one of due events; returns rows handled."""
+        handled = 0
+        for kind in ("Lead", "Event"):
+            rows = self._claim(kind)
+            if not rows:
+                continue
+            records = []
+            for _, payload, who_id in rows:
+                record = json.loads(payload)
+                if who_id:
+                    record["WhoId"] = who_id
+                record["attributes"] = {"type": kind}
+                records.append(record)
+            try:
+                results = self.salesforce.create_records(records)
+            except Exception as e:
+                self.logger.error(f"Outbox batch of {len(rows)} {kind} records failed: {e}")
+                results = None
+            if results is None:
+                for row in rows:
+                    self._mark_failed(row[0], "batch request failed")
+            else:
+                for row, record, result in zip(rows, records, results):
+                    self._apply_result(kind, row[0], record, result)
+            handled += len(rows)
+        return handled
+
+    def _apply_result(self, kind: str, row_id: int, record: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if result.get("success"):
+            self._mark_sent(row_id, result.get("id"))
+            return
+        errors = result.get("errors") or []
+        codes = {e.get("statusCode") for e in errors}
+        if kind == "Lead" and "DUPLICATES_DETECTED" in codes:
+            # Collections don't return the matched record; resolve it with the single-record call.
+            record.pop("attributes", None)
+            lead_info = {"Name": record["LastName"], "Company": record["Company"], "Email": record["Email"], "Phone": record["Phone"]}
+            created, lead_id = self.salesforce.create_lead(lead_info)
+            if created:
+                self._mark_sent(row_id, lead_id)
+                return
+        self._mark_failed(row_id, json.dumps(errors)[:1000])
+
+    def _mark_sent(self, row_id: int, sf_id: Optional[str]) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = 'sent', sf_id = ?, error = NULL, claimed_at = NULL WHERE id = ?", (sf_id, row_id))
+        self.logger.info(f"Outbox row {row_id} written to Salesforce as {sf_id}")
+
+    def _mark_failed(self, row_id: int, error: str) -> None:
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM outbox WHERE id = ?", (row_id,)).fetchone()[0] + 1
+            status = "dead" if attempts >= self.max_attempts else "pending"
+            delay = min(3600, self.backoff * (2 ** (attempts - 1)))
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, status = ?, next_attempt_at = ?, error = ?, claimed_at = NULL WHERE id = ?",
+                (attempts, status, time.time() + delay, error, row_id),
+            )
+        log = self.logger.error if status == "dead" else self.logger.warning
+        log(f"Outbox row {row_id} failed (attempt {attempts}, now {status}): {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM outbox GROUP BY kind, status").fetchall()
+        return {f"{kind.lower()}_{status}": count for kind, status, count in rows}
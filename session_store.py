@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import sys
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from enum import Enum
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional
+
+# fn(state or None) -> new state; applied atomically per user by SessionStore.update
+Updater = Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]
+
+class Stage(Enum):
+    WAITING_SERVICE = "waiting_service"
+    WAITING_LOCATION = "waiting_location"
+    OFFER_ACTIONS = "offer_actions"
+    CHOOSE_SLOT = "choose_slot"
+    HANDOFF = "handoff"
+
+class SessionRecord:
+    """Fixed-field session kept by InMemorySessionStore instead of a free-form dict.
+
+    Only the fields the WhatsApp stage machine uses are allowed; any other key
+    raises ValueError rather than being silently dropped (SQLiteSessionStore
+    would keep it). Service and slot labels come from small fixed menus and
+    are interned.
+    """
+    __slots__ = ("stage", "service", "location", "slot", "handoff_time", "expires_at")
+    FIELDS = ("service", "location", "slot", "handoff_time")
+
+    def __init__(self, stage: Stage, service: Optional[str] = None, location: Optional[str] = None,
+                 slot: Optional[str] = None, handoff_time: Optional[float] = None, expires_at: float = 0.0):
+        self.stage = stage
+        self.service = sys.intern(service) if service else None
+        self.location = location
+        self.slot = sys.intern(slot) if slot else None
+        self.handoff_time = handoff_time
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any], expires_at: float) -> "SessionRecord":
+        unknown = set(state) - {"stage", *cls.FIELDS}
+        if unknown:
+            raise ValueError(f"Unsupported session fields: {sorted(unknown)}")
+        return cls(Stage(state.get("stage", Stage.WAITING_SERVICE.value)), state.get("service"), state.get("location"),
+                   state.get("slot"), state.get("handoff_time"), expires_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        state = {"stage": self.stage.value}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                state[field] = value
+        return state
+
+    def size_bytes(self) -> int:
+        size = sys.getsizeof(self)
+        if self.location is not None:
+            size += sys.getsizeof(self.location)
+        return size
+
+class SessionStore(ABC):
+    """Per-user WhatsApp session state with TTL expiry and atomic read-modify-write."""
+    def __init__(self, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        self.logger = logging.getLogger("session_store")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+
+    @abstractmethod
+    def get(self, user: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, user: str, state: Dict[str, Any]) -> None:
+        self.update(user, lambda _: state)
+
+    @abstractmethod
+    def delete(self, user: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, user: str, fn: Updater) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def __contains__(self, user: str) -> bool:
+        return self.get(user) is not None
+
+class InMemorySessionStore(SessionStore):
+    """Process-local backend; only correct with a single worker.
+
+    Records are kept in last-write order, so sessions idle for longer than
+    ``ttl`` are dropped from the front on every write, and the least recently
+    active session is evicted once ``max_entries`` is reached.
+    """
+    def __init__(self, ttl: float = 7 * 24 * 3600, max_entries: int = 100000):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # user -> SessionRecord
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, user: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._data.get(user)
+            if record is None:
+                return None
+            if record.expires_at <= time.time():
+                del self._data[user]
+                self.expired += 1
+                return None
+            return record.to_dict()
+
+    def delete(self, user: str) -> None:
+        with self._lock:
+            self._data.pop(user, None)
+
+    def update(self, user: str, fn: Updater) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            self._expire_idle(now)
+            record = self._data.get(user)
+            state = fn(record.to_dict() if record is not None else None)
+            # Only touch the map once fn has succeeded, so a failing update leaves the old session in place.
+            updated = SessionRecord.from_dict(state, now + self.ttl)
+            self._data.pop(user, None)
+            while len(self._data) >= self.max_entries:
+                self._data.popitem(last=False)
+                self.evicted += 1
+            self._data[user] = updated
+            return state
+
+    def _expire_idle(self, now: float) -> int:
+        removed = 0
+        while self._data:
+            record = next(iter(self._data.values()))
+            if record.expires_at > now:
+                break
+            self._data.popitem(last=False)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._expire_idle(time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self._data.values())
+        return {
+            "backend": "memory",
+            "entries": len(records),
+            "max_entries": self.max_entries,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "approx_bytes": sys.getsizeof(self._data) + sum(r.size_bytes() for r in records),
+        }
+
+class SQLiteSessionStore(SessionStore):
+    """Shared backend for several uvicorn workers on one host (SQLite in WAL mode).
+
+    ``update`` runs inside ``BEGIN IMMEDIATE`` so concurrent read-modify-writes
+    for the same user from different processes are serialized.
+    """
+    def __init__(self, path: str = "sessions.db", ttl: float = 7 * 24 * 3600, purge_every: int = 1000,
+                 max_entries: int = 100000):
+        super().__init__(ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, user: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE user = ? AND expires_at > ?", (user, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, user: str) -> None:
+        self._conn().execute("DELETE FROM sessions WHERE user = ?", (user,))
+
+    def update(self, user: str, fn: Updater) -> Dict[str, Any]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT data FROM sessions WHERE user = ? AND expires_at > ?", (user, now)).fetchone()
+            state = fn(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT INTO sessions (user, data, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                (user, json.dumps(state, separators=(",", ":")), now + self.ttl),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            self.purge_expired()
+        return state
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+        # Enforce the entry cap by dropping the sessions that were active longest ago.
+        removed += conn.execute(
+            "DELETE FROM sessions WHERE user IN (SELECT user FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        if removed:
+            self.logger.info(f"Purged {removed} expired or over-cap sessions")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        size = conn.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "entries": count, "max_entries": self.max_entries, "approx_bytes": size}
+
+def make_session_store(url: Optional[str] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None) -> SessionStore:
+    """Build a store from SESSION_STORE_URL: 'memory' (default) or 'sqlite:///path/to/sessions.db'.
+
+    ``ttl`` is the idle timeout (SESSION_TTL_SECONDS, default 7 days) and
+    ``max_entries`` the hard cap (SESSION_MAX_ENTRIES, default 100000).
+    """
+    url = url or os.getenv("SESSION_STORE_URL", "memory")
+    ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+    max_entries = max_entries if max_entries is not None else int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+    if url == "memory":
+        return InMemorySessionStore(ttl=ttl, max_entries=max_entries)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):], ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unsupported SESSION_STORE_URL: {url}")
@@ -0,0 +1,25 @@
+from datetime import date
+from availability import AvailabilityEngine, make_availability_engine
+from salesforce_api import SalesforceAPI
+
+SUNDAY = date(2026, 10, 18)
+MONDAY = date(2026, 10, 19)
+
+
+def test_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("SF_DAY_START", "09:00")
+    monkeypatch.setenv("SF_DAY_END", "11:00")
+    monkeypatch.setenv("SF_SLOT_MINUTES", "60")
+    monkeypatch.setenv("SF_WORKING_DAYS", "0,1,2,3,4")
+    engine = make_availability_engine()
+    assert engine.labels == ["09:00", "10:00"]
+    assert engine.days(SUNDAY, MONDAY) == [MONDAY]
+
+
+def test_no_slots_on_a_non_working_day():
+    api = SalesforceAPI(background_refresh=False, advisor_id="005A",
+                        availability=AvailabilityEngine(working_days=range(5)))
+    masks = api._busy([api.advisor_id], SUNDAY, SUNDAY)
+    assert masks == {}
+    assert api._today_labels(masks, SUNDAY) == []
+    assert api.availability_stats()["hits"] == 0
@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+from context_packer import ContextPacker
+
+OVERLAP = "the paint is washable and dries within four hours of application"
+
+
+def doc(text, page=1, source="kb.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_select_keeps_min_k_then_drops_weak_hits():
+    packer = ContextPacker(min_k=2, max_k=4, score_margin=0.05)
+    # chunk 1 is kept by min_k, chunk 3 falls outside the margin and chunk 4 outside max_k.
+    scored = [(doc(f"chunk {i}"), score) for i, score in enumerate([0.9, 0.5, 0.88, 0.80, 0.89])]
+    assert [d.page_content for d in packer.select(scored)] == ["chunk 0", "chunk 1", "chunk 2"]
+    assert packer.select([]) == []
+
+
+def test_overlapping_chunks_on_a_page_are_stitched():
+    packer = ContextPacker()
+    context = packer.pack([doc("Interior work: " + OVERLAP), doc(OVERLAP + ". Exterior work takes two days.")])
+    assert context == "Interior work: " + OVERLAP + ". Exterior work takes two days."
+
+
+def test_nested_chunk_is_dropped_and_other_pages_are_not_stitched():
+    packer = ContextPacker()
+    context = packer.pack([doc("Interior work: " + OVERLAP), doc(OVERLAP), doc(OVERLAP + " for outdoor walls", page=2)])
+    assert context.split("\n") == ["Interior work: " + OVERLAP, OVERLAP + " for outdoor walls"]
+
+
+def test_near_duplicates_across_pages_are_dropped():
+    packer = ContextPacker(duplicate_threshold=0.8)
+    text = "Villa painting includes putty, primer and two coats of premium emulsion paint on all walls"
+    context = packer.pack([doc(text, page=1), doc(text + " too", page=5)])
+    assert context == text
+
+
+def test_pack_stops_at_the_token_budget():
+    packer = ContextPacker(token_budget=60)
+    chunks = [doc(f"section {i} " + "lorem ipsum dolor " * 20, page=i) for i in range(5)]
+    context = packer.pack(chunks)
+    assert context.startswith("section 0")
+    assert "section 2" not in context
+    assert packer.stats()["tokens_out"] < packer.stats()["tokens_in"]
@@ -0,0 +1,68 @@
+from conversation_memory import ConversationMemory, count_tokens
+
+
+class FakeLLM:
+    def __init__(self, summary="customer wants villa painting", fail=False):
+        self.summary = summary
+        self.fail = fail
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("llm down")
+        return type("Message", (), {"content": self.summary})()
+
+
+def test_recent_returns_the_newest_turns_oldest_first():
+    memory = ConversationMemory()
+    for i in range(5):
+        memory.append(f"Human: message {i}")
+    assert memory.recent(2) == ["Human: message 3", "Human: message 4"]
+
+
+def test_compact_is_a_no_op_within_budget():
+    memory = ConversationMemory(max_turns=10)
+    memory.append("Human: hi")
+    llm = FakeLLM()
+    memory.compact(llm)
+    assert llm.prompts == [] and memory.summary == ""
+
+
+def test_full_buffer_folds_the_oldest_half_into_the_summary():
+    memory = ConversationMemory(max_turns=4)
+    for i in range(4):
+        memory.append(f"Human: message {i}")
+    llm = FakeLLM()
+    memory.compact(llm)
+    assert len(llm.prompts) == 1 and "Human: message 0" in llm.prompts[0]
+    assert memory.turns() == ["Human: message 2", "Human: message 3"]
+    assert memory.recent(3) == ["Summary of earlier conversation: customer wants villa painting",
+                                "Human: message 2", "Human: message 3"]
+
+
+def test_turns_evicted_from_the_ring_are_still_summarized():
+    memory = ConversationMemory(max_turns=2)
+    for i in range(3):
+        memory.append(f"Human: message {i}")
+    llm = FakeLLM()
+    memory.compact(llm)
+    assert "Human: message 0" in llm.prompts[0]
+
+
+def test_summarizer_failure_keeps_the_customers_words():
+    memory = ConversationMemory(max_turns=2)
+    memory.append("Human: my email is sara@example.com")
+    memory.append("Assistant: thanks")
+    memory.compact(FakeLLM(fail=True))
+    assert "sara@example.com" in memory.summary
+    assert "thanks" not in memory.summary
+
+
+def test_long_turns_are_clipped_and_the_budget_triggers_compaction():
+    memory = ConversationMemory(max_turns=30, token_budget=100, turn_token_cap=40)
+    for i in range(5):
+        memory.append(f"Human: {'paint ' * 200}{i}")
+    assert all(count_tokens(turn) <= 45 for turn in memory.turns())
+    memory.compact(FakeLLM())
+    assert sum(count_tokens(turn) for turn in memory.turns()) <= 50
@@ -0,0 +1,98 @@
+import hashlib
+from pathlib import Path
+import pytest
+import corpus_manager
+from corpus_manager import CorpusManager, page_ranges
+
+
+class CountingEmbeddings:
+    """Deterministic bag-of-letters vectors; remembers how many texts it embedded."""
+    def __init__(self):
+        self.embedded = 0
+
+    @staticmethod
+    def _vector(text):
+        digest = hashlib.sha256(text.encode()).digest()
+        return [b / 255 for b in digest[:8]]
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def text_pdfs(monkeypatch):
+    """Treat each *.pdf as a one-page plain-text document."""
+    def parse(task):
+        path, start, stop = task
+        with open(path, encoding="utf-8") as f:
+            return [(f.read(), {"source": path, "page": 0})]
+    monkeypatch.setattr(corpus_manager, "_page_count", lambda path: 1)
+    monkeypatch.setattr(corpus_manager, "_parse_pages", parse)
+
+
+@pytest.fixture
+def manager(tmp_path, text_pdfs):
+    source = tmp_path / "kb"
+    source.mkdir()
+    (source / "a.pdf").write_text("Villa painting takes three days.")
+    (source / "b.pdf").write_text("Deep cleaning starts at 500 AED.")
+    swaps = []
+    m = CorpusManager(str(source), CountingEmbeddings(), "fake", str(tmp_path / "cache"), workers=1,
+                      on_swap=swaps.append)
+    m.swaps = swaps
+    return m
+
+
+def texts(m):
+    return sorted(doc.page_content for doc in m.current.docs)
+
+
+def test_page_ranges_split_one_big_pdf_across_workers():
+    assert page_ranges({"big.pdf": 10}, 4) == [("big.pdf", 0, 3), ("big.pdf", 3, 6), ("big.pdf", 6, 9), ("big.pdf", 9, 10)]
+    assert page_ranges({"a.pdf": 2, "b.pdf": 1}, 1) == [("a.pdf", 0, 2), ("b.pdf", 0, 1)]
+
+
+def test_new_document_is_the_only_one_embedded(manager):
+    assert manager.refresh()
+    assert manager.embeddings.embedded == 2
+    (Path(manager.source) / "c.pdf").write_text("AC repair is same day.")
+    assert manager.refresh()
+    assert manager.embeddings.embedded == 3
+    assert len(texts(manager)) == 3
+
+
+def test_changed_document_is_re_embedded(manager):
+    manager.refresh()
+    (Path(manager.source) / "a.pdf").write_text("Villa painting now takes two days only.")
+    assert manager.refresh()
+    assert manager.embeddings.embedded == 3
+    assert "Villa painting now takes two days only." in texts(manager)
+    assert "Villa painting takes three days." not in texts(manager)
+
+
+def test_removed_document_drops_out_without_embedding(manager, monkeypatch):
+    manager.refresh()
+    monkeypatch.setattr(corpus_manager, "PRUNE_GRACE_SECONDS", -1)
+    removed_key = manager.current.sources[str(Path(manager.source) / "b.pdf")]
+    (Path(manager.source) / "b.pdf").unlink()
+    assert manager.refresh()
+    assert manager.embeddings.embedded == 2
+    assert texts(manager) == ["Villa painting takes three days."]
+    assert not Path(manager._doc_cache_path(removed_key)).exists()
+
+
+def test_refresh_swaps_a_complete_corpus(manager):
+    manager.refresh()
+    first = manager.current
+    first_docs = list(first.docs)
+    assert not manager.refresh()  # nothing changed
+    (Path(manager.source) / "c.pdf").write_text("AC repair is same day.")
+    manager.refresh()
+    assert manager.current is not first
+    assert manager.swaps == [first, manager.current]
+    assert first.docs == first_docs  # readers holding the old corpus see it unchanged
+    assert len(manager.current.docs) == manager.current.vector_store.index.ntotal == 3
@@ -0,0 +1,35 @@
+import pytest
+from intent_router import IntentRouter, GREETING, OFF_TOPIC, KNOWLEDGE
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter(examples=None)
+
+
+@pytest.mark.parametrize("message", [
+    "what is your phone number",
+    "who is the owner",
+    "can I get a discount",
+    "can you help me",
+    "thanks a lot",
+    "are you available tomorrow",
+    "do you paint villas in Dubai Marina",
+])
+def test_business_questions_reach_the_knowledge_base(router, message):
+    assert router.classify(message)[0] == KNOWLEDGE
+
+
+@pytest.mark.parametrize("message", [
+    "what is the weather today",
+    "tell me a joke",
+    "write me a python program",
+    "who won the football match yesterday",
+])
+def test_clear_off_topic_questions(router, message):
+    assert router.classify(message)[0] == OFF_TOPIC
+
+
+@pytest.mark.parametrize("message", ["hi", "Hello!", "good morning"])
+def test_greetings(router, message):
+    assert router.classify(message)[0] == GREETING
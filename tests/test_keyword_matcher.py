@@ -0,0 +1,20 @@
+import pytest
+from keyword_matcher import KeywordMatcher
+
+matcher = KeywordMatcher({"rate", "amount", "how much", "what is the cost"})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("what is your rate?", "rate"),
+    ("How much for a villa", "how much"),
+    ("so what is the cost then", "what is the cost"),
+    ("AMOUNT please", "amount"),
+])
+def test_whole_words_and_phrases_match(text, expected):
+    assert matcher.find(text) == expected
+
+
+@pytest.mark.parametrize("text", ["decorating my kids room", "paramount tower", "how are you", "much later", ""])
+def test_no_match_inside_words_or_on_partial_phrases(text):
+    assert matcher.find(text) is None
+    assert text not in matcher
@@ -0,0 +1,50 @@
+import pytest
+from lead_extractor import extract_contact_fields
+from lead_tool import LeadTool
+from lead_state import LeadState
+
+
+@pytest.mark.parametrize("message", [
+    "I am planning to repaint",
+    "this is urgent",
+    "call me tomorrow",
+    "i am ahmed",
+    "I'm interested in villa painting",
+])
+def test_soft_cues_without_a_capitalised_name_are_not_names(message):
+    fields, _ = extract_contact_fields(message)
+    assert "Name" not in fields
+
+
+@pytest.mark.parametrize("message, name", [
+    ("my name is ahmed khan", "Ahmed Khan"),
+    ("Name: sara", "Sara"),
+    ("Hi, this is Ahmed Khan", "Ahmed Khan"),
+    ("I am Sara, sara@example.com", "Sara"),
+])
+def test_names_from_explicit_or_capitalised_cues(message, name):
+    fields, _ = extract_contact_fields(message)
+    assert fields["Name"] == name
+
+
+def test_email_and_phone():
+    fields, rest = extract_contact_fields("my email is a.b@example.com and phone 050 123 4567")
+    assert fields == {"Email": "a.b@example.com", "Phone": "+971501234567"}
+
+
+@pytest.mark.parametrize("message", ["I am planning to repaint", "this is urgent", "call me tomorrow"])
+def test_false_positive_names_go_to_the_llm(message):
+    tool = LeadTool(salesforce_api=object())
+    tool.state = LeadState.COLLECTING_INFO
+    handled, info = tool._extract_locally(message)
+    assert not handled and info is None
+
+
+def test_local_name_never_overwrites_collected_name():
+    tool = LeadTool(salesforce_api=object())
+    tool.state = LeadState.COLLECTING_INFO
+    tool.partial_lead_info = {"Name": "Ahmed Khan", "Email": "ahmed@example.com"}
+    handled, info = tool._extract_locally("This is Sara, 0501234567")
+    assert handled
+    assert info["Name"] == "Ahmed Khan"
+    assert info["Phone"] == "+971501234567"
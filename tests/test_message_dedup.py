@@ -0,0 +1,58 @@
+import asyncio
+from message_dedup import MessageDedup
+
+
+def test_retry_on_another_worker_replays_the_first_reply(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first, second = MessageDedup(path=path, poll_interval=0.01), MessageDedup(path=path, poll_interval=0.01)
+    calls = []
+
+    async def compute(name):
+        calls.append(name)
+        await asyncio.sleep(0.05)
+        return f"<Response>{name}</Response>"
+
+    async def run():
+        return await asyncio.gather(first.run("SM1", lambda: compute("first")),
+                                    second.run("SM1", lambda: compute("second")))
+
+    replies = asyncio.run(run())
+    assert len(calls) == 1
+    assert replies[0] == replies[1]
+    assert first.stats()["shared_hits"] + second.stats()["shared_hits"] == 1
+
+
+def test_failed_turn_is_recomputed_by_the_next_retry(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    dedup = MessageDedup(path=path)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def ok():
+        return "<Response/>"
+
+    async def run():
+        try:
+            await dedup.run("SM2", fail)
+        except RuntimeError:
+            pass
+        return await MessageDedup(path=path).run("SM2", ok)
+
+    assert asyncio.run(run()) == "<Response/>"
+
+
+def test_in_process_retries_share_one_computation():
+    dedup = MessageDedup()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "<Response/>"
+
+    async def run():
+        return await asyncio.gather(dedup.run("SM3", compute), dedup.run("SM3", compute))
+
+    assert asyncio.run(run()) == ["<Response/>", "<Response/>"]
+    assert len(calls) == 1
@@ -0,0 +1,68 @@
+import pytest
+import requests
+from salesforce_api import SalesforceAPI
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+
+def make_api(outcomes):
+    """A SalesforceAPI whose session plays back ``outcomes`` (exceptions or status codes) in order."""
+    api = SalesforceAPI(max_attempts=3, backoff=0, background_refresh=False)
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    api.session.request = request
+    return api, calls
+
+
+def test_post_is_not_retried_after_a_read_timeout():
+    api, calls = make_api([requests.ReadTimeout("slow"), 201])
+    with pytest.raises(requests.ReadTimeout):
+        api._request("POST", "sobjects/Lead", json={})
+    assert calls == ["POST"]
+
+
+def test_post_is_retried_when_the_connection_failed():
+    api, calls = make_api([requests.ConnectionError("refused"), 201])
+    assert api._request("POST", "sobjects/Lead", json={}).status_code == 201
+    assert calls == ["POST", "POST"]
+
+
+@pytest.mark.parametrize("method, status, expected_calls", [
+    ("POST", 503, 1),
+    ("POST", 429, 3),
+    ("GET", 503, 3),
+])
+def test_status_retries_depend_on_the_method(method, status, expected_calls):
+    api, calls = make_api([status])
+    assert api._request(method, "query").status_code == status
+    assert len(calls) == expected_calls
+
+
+def test_concurrent_coroutines_authenticate_once():
+    import asyncio
+    api = SalesforceAPI(background_refresh=False)
+    calls = []
+
+    async def authenticate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        api._store_token({"access_token": "t", "instance_url": "https://example.my.salesforce.com"})
+
+    api._aauthenticate = authenticate
+
+    async def run():
+        await asyncio.gather(*(api._aensure_token() for _ in range(10)))
+
+    asyncio.run(run())
+    assert len(calls) == 1
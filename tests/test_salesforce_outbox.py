@@ -0,0 +1,104 @@
+import json
+import pytest
+from salesforce_api import SalesforceAPI
+from salesforce_outbox import SalesforceOutbox
+
+LEAD = {"Name": "Sara", "Company": "Acme", "Email": "sara@example.com", "Phone": "+971501234567"}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+class FakeSalesforce(SalesforceAPI):
+    """Answers composite/sobjects calls without any network; every record succeeds unless ``succeed`` is False."""
+    def __init__(self):
+        super().__init__(background_refresh=False)
+        self.batches = []
+        self.succeed = True
+
+    def _ensure_token(self):
+        pass
+
+    def _request(self, method, path, **kwargs):
+        records = kwargs["json"]["records"]
+        self.batches.append(records)
+        results = []
+        for i, record in enumerate(records):
+            if self.succeed:
+                results.append({"success": True, "id": f"{record['attributes']['type']}{len(self.batches)}{i}"})
+            else:
+                results.append({"success": False, "errors": [{"statusCode": "FIELD_INTEGRITY_EXCEPTION"}]})
+        return FakeResponse(200, results)
+
+
+@pytest.fixture
+def salesforce():
+    return FakeSalesforce()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def test_claimed_rows_are_not_sent_by_a_second_drainer(salesforce, db_path):
+    first = SalesforceOutbox(salesforce, path=db_path)
+    second = SalesforceOutbox(salesforce, path=db_path)
+    first.enqueue_lead(LEAD)
+    claimed = first._claim("Lead")
+    assert len(claimed) == 1
+    assert second._claim("Lead") == []
+    assert second.drain_once() == 0
+    assert salesforce.batches == []
+
+
+def test_stale_claims_are_reclaimed(salesforce, db_path):
+    first = SalesforceOutbox(salesforce, path=db_path)
+    second = SalesforceOutbox(salesforce, path=db_path, claim_timeout=0)
+    first.enqueue_lead(LEAD)
+    first._claim("Lead")
+    assert second.drain_once() == 1
+    assert second.stats() == {"lead_sent": 1}
+
+
+def test_duplicate_enqueues_share_one_row(salesforce, db_path):
+    outbox = SalesforceOutbox(salesforce, path=db_path)
+    first = outbox.enqueue_lead(LEAD)
+    second = outbox.enqueue_lead(dict(LEAD, Email="SARA@example.com"))
+    assert first == second
+    outbox.drain_once()
+    assert [len(batch) for batch in salesforce.batches] == [1]
+
+
+def test_event_waits_for_its_lead(salesforce, db_path):
+    outbox = SalesforceOutbox(salesforce, path=db_path)
+    lead_ref = outbox.enqueue_lead(LEAD)
+    outbox.enqueue_event(lead_ref, "10:00")
+    assert outbox._claim("Event") == []
+    outbox.drain_once()
+    lead_batch, event_batch = salesforce.batches
+    assert event_batch[0]["WhoId"] == "Lead10"
+    assert outbox.stats() == {"lead_sent": 1, "event_sent": 1}
+
+
+def test_dead_lead_takes_its_events_down_and_revives_with_them(salesforce, db_path):
+    outbox = SalesforceOutbox(salesforce, path=db_path, max_attempts=1)
+    salesforce.succeed = False
+    lead_ref = outbox.enqueue_lead(LEAD)
+    outbox.enqueue_event(lead_ref, "10:00")
+    outbox.drain_once()
+    outbox.drain_once()
+    assert outbox.stats() == {"lead_dead": 1, "event_dead": 1}
+
+    salesforce.succeed = True
+    assert outbox.enqueue_lead(LEAD) == lead_ref
+    assert outbox.stats() == {"lead_pending": 1, "event_pending": 1}
+    outbox.drain_once()
+    assert outbox.stats() == {"lead_sent": 1, "event_sent": 1}
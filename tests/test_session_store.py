@@ -0,0 +1,34 @@
+import pytest
+from session_store import SessionStore, InMemorySessionStore, SQLiteSessionStore
+
+
+def fail(state):
+    raise RuntimeError("boom")
+
+
+def test_failed_update_keeps_the_session():
+    store = InMemorySessionStore()
+    store.set("u1", {"stage": "waiting_location", "service": "Painting"})
+    with pytest.raises(RuntimeError):
+        store.update("u1", fail)
+    assert store.get("u1") == {"stage": "waiting_location", "service": "Painting"}
+
+
+def test_unknown_fields_are_rejected_in_memory():
+    store = InMemorySessionStore()
+    store.set("u1", {"stage": "waiting_service"})
+    with pytest.raises(ValueError):
+        store.set("u1", {"stage": "waiting_service", "notes": "x"})
+    assert store.get("u1") == {"stage": "waiting_service"}
+
+
+def test_backends_round_trip_the_same_state(tmp_path):
+    state = {"stage": "handoff", "service": "Painting", "location": "JVC", "slot": "10:00", "handoff_time": 1.5}
+    for store in (InMemorySessionStore(), SQLiteSessionStore(str(tmp_path / "sessions.db"))):
+        store.set("u1", dict(state))
+        assert store.get("u1") == state
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
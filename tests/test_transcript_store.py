@@ -0,0 +1,26 @@
+import pytest
+from transcript_store import TranscriptStore, DirectoryLocked
+
+
+def test_rotation_survives_a_failed_sidecar(tmp_path, monkeypatch):
+    store = TranscriptStore(str(tmp_path), segment_max_bytes=1, compact_every=0)
+
+    def broken_sidecar(segment_id, entries):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write_sidecar", broken_sidecar)
+    store._commit([{"session": "s1", "role": "user", "content": "hi"}])
+    store._commit([{"session": "s1", "role": "assistant", "content": "hello"}])
+    assert [r["content"] for r in store.replay("s1")] == ["hi", "hello"]
+
+    store.close()
+    reopened = TranscriptStore(str(tmp_path), compact_every=0)
+    assert [r["content"] for r in reopened.replay("s1")] == ["hi", "hello"]
+
+
+def test_a_directory_has_one_writer(tmp_path):
+    store = TranscriptStore(str(tmp_path), compact_every=0)
+    with pytest.raises(DirectoryLocked):
+        TranscriptStore(str(tmp_path), compact_every=0)
+    store.close()
+    TranscriptStore(str(tmp_path), compact_every=0).close()
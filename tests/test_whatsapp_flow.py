@@ -0,0 +1,43 @@
+from whatsapp_flow import (ANSWER_WITH_RAG, EXPERT_CONTACT, INVALID_SERVICE, INVALID_SLOT, SERVICE_MENU, THANKS,
+                           advance, services, time_slots)
+
+
+def test_booking_walks_through_every_stage():
+    state = {"stage": "waiting_service"}
+    assert "Please type your location" in advance(state, "3", "+971500000001")
+    assert state == {"stage": "waiting_location", "service": services["3"]}
+    reply = advance(state, "jvc, building 4", "+971500000001")
+    assert state["stage"] == "offer_actions" and "jvc, building 4" in reply.texts[0]
+    advance(state, "1", "+971500000001")
+    assert state["stage"] == "choose_slot"
+    reply = advance(state, "2", "+971500000001")
+    assert state["stage"] == "handoff" and state["slot"] == time_slots["2"]
+    assert reply.texts[0].startswith("Booked")
+
+
+def test_invalid_choices_keep_the_stage():
+    state = {"stage": "waiting_service"}
+    assert advance(state, "42", "u") is INVALID_SERVICE
+    assert state["stage"] == "waiting_service"
+    state = {"stage": "choose_slot", "location": "JVC"}
+    assert advance(state, "9", "u") is INVALID_SLOT
+    assert state["stage"] == "choose_slot"
+
+
+def test_global_rules_come_before_the_stage():
+    state = {"stage": "choose_slot", "service": "Office painting", "location": "JVC"}
+    assert advance(state, "menu", "u") is SERVICE_MENU
+    assert state == {"stage": "waiting_service"}
+    assert advance(state, "thanks", "u") is THANKS
+
+
+def test_pricing_hands_off_then_shares_the_expert():
+    state = {"stage": "waiting_location", "service": "Office painting"}
+    reply = advance(state, "how much does it cost", "+971500000001")
+    assert state["stage"] == "handoff" and "estimator" in reply.texts[0]
+    assert advance(state, "what are your rates", "+971500000001") is EXPERT_CONTACT
+
+
+def test_handoff_questions_go_to_the_rag_agent():
+    state = {"stage": "handoff"}
+    assert advance(state, "do you paint doors", "u") is ANSWER_WITH_RAG
@@ -0,0 +1,47 @@
+import re
+import hashlib
+from collections import Counter
+from typing import List, Optional
+
+TOPIC_MODES = ("llm", "periodic", "chunks")
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "your", "you", "our", "are", "was", "were",
+    "will", "can", "have", "has", "had", "not", "but", "all", "any", "its", "into", "also", "more",
+    "their", "them", "they", "which", "who", "what", "when", "where", "how", "than", "then", "there",
+    "about", "such", "each", "other", "per", "via", "www", "com", "servicezone", "uae",
+}
+
+class TopicState:
+    """Per-conversation topic tracking used by PDFQATool when the topic mode is not 'llm'.
+
+    ``topic`` is the last known topic, ``turns_since_refresh`` counts answers
+    since it was last set by the LLM and ``chunk_ids`` are the chunks retrieved
+    on the previous turn, used to detect when retrieval moves elsewhere.
+    """
+    __slots__ = ("topic", "turns_since_refresh", "chunk_ids")
+
+    def __init__(self):
+        self.topic: Optional[str] = None
+        self.turns_since_refresh = 0
+        self.chunk_ids: List[str] = []
+
+def chunk_id(doc) -> str:
+    page = doc.metadata.get("page", "") if getattr(doc, "metadata", None) else ""
+    return hashlib.md5(f"{page}:{doc.page_content}".encode()).hexdigest()[:12]
+
+def retrieval_shifted(previous: List[str], current: List[str], min_overlap: float = 0.4) -> bool:
+    if not previous:
+        return True
+    a, b = set(previous), set(current)
+    return len(a & b) / len(a | b) < min_overlap
+
+def topic_from_chunks(docs, max_terms: int = 3) -> str:
+    """Cheap topic label: the most frequent content words of the retrieved chunks."""
+    counts = Counter()
+    for rank, doc in enumerate(docs):
+        weight = len(docs) - rank
+        for word in re.findall(r"[a-z][a-z\-]{2,}", doc.page_content.lower()):
+            if word not in _STOPWORDS:
+                counts[word] += weight
+    return ", ".join(w for w, _ in counts.most_common(max_terms))
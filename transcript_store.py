@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import queue
+import threading
+import logging
+try:
+    import fcntl
+except ImportError:  # Windows: the single-writer rule is not enforced
+    fcntl = None
+from typing import Any, Dict, List, Optional, Tuple
+
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx.json"
+TMP_SUFFIX = ".tmp"
+LOCK_NAME = "LOCK"
+
+class DirectoryLocked(RuntimeError):
+    """Another process already writes to this transcript directory."""
+
+# (seq, segment id, byte offset, byte length) of one record
+IndexEntry = Tuple[int, int, int, int]
+
+class TranscriptStore:
+    """Append-only chat transcripts in JSONL segments.
+
+    ``append`` only queues the record. A writer thread appends queued
+    records to the active segment and fsyncs once per batch (group
+    commit), so one turn costs O(1) however long the conversation is.
+    Full segments are sealed with a sidecar index of (session, seq,
+    offset, length). Opening the store then needs to scan only segments
+    whose sidecar is missing. ``compact`` merges sealed segments into one
+    file grouped by session and can drop sessions past the retention
+    window. The merged file is committed with a single os.replace, and
+    its header lists the segments it replaces, so a crash at any point
+    leaves a consistent store.
+
+    Replay order comes from a per-record ``seq``, so segment ids only need to
+    be unique. Each directory must have exactly one writer process; the
+    store holds an exclusive lock on ``<directory>/LOCK`` while it is open
+    and raises DirectoryLocked if another process has it.
+    """
+    def __init__(self, directory: str = "chat_history", segment_max_bytes: int = 8 * 1024 * 1024,
+                 commit_interval: float = 0.05, max_batch: int = 512, compact_every: float = 3600.0,
+                 retention_days: Optional[float] = None):
+        self.logger = logging.getLogger("transcript_store")
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        handler.setFormatter(formatter)
+        if not self.logger.hasHandlers():
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.compact_every = compact_every
+        self.retention_days = retention_days
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._compact_lock = threading.Lock()
+        self._index: Dict[str, List[IndexEntry]] = {}
+        self._sealed: List[int] = []
+        self._submitted = 0
+        self._durable = 0
+        self._commits = 0
+        self._threads: List[threading.Thread] = []
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._acquire_directory()
+        self._recover()
+        self._next_id = max(self._sealed, default=0) + 1
+        self._active_id = self._take_id()
+        self._active = open(self._segment_path(self._active_id), "ab")
+        self._active_entries: List[Tuple[str, int, int, int]] = []
+
+    # ---- Paths
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_id:08d}{SEGMENT_SUFFIX}")
+
+    def _sidecar_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_id:08d}{INDEX_SUFFIX}")
+
+    def _segment_ids(self) -> List[int]:
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                ids.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(ids)
+
+    def _take_id(self) -> int:
+        segment_id = self._next_id
+        self._next_id += 1
+        return segment_id
+
+    def _acquire_directory(self):
+        lock_file = open(os.path.join(self.directory, LOCK_NAME), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise DirectoryLocked(f"Transcript directory {self.directory} is in use by another process")
+        return lock_file
+
+    def close(self) -> None:
+        """Close the active segment and release the directory; call flush() first."""
+        with self._lock:
+            self._active.close()
+        self._lock_file.close()
+
+    # ---- Recovery
+
+    def _recover(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(TMP_SUFFIX):
+                os.remove(os.path.join(self.directory, name))
+        ids = self._segment_ids()
+        replaced = set()
+        for segment_id in ids:
+            replaced.update(self._read_header(segment_id).get("replaces", []))
+        for segment_id in replaced:
+            self._remove_segment(segment_id)
+        self._seq = 0
+        for segment_id in ids:
+            if segment_id in replaced:
+                continue
+            entries = self._load_sidecar(segment_id)
+            if entries is None:
+                entries = self._scan_segment(segment_id)
+                self._write_sidecar(segment_id, entries)
+            self._add_entries(segment_id, entries)
+            self._sealed.append(segment_id)
+        self.logger.info(f"Opened {len(self._sealed)} transcript segments with {len(self._index)} sessions in {self.directory}")
+
+    def _read_header(self, segment_id: int) -> Dict[str, Any]:
+        with open(self._segment_path(segment_id), "rb") as f:
+            line = f.readline()
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return {}
+        return record.get("header", {}) if isinstance(record, dict) else {}
+
+    def _scan_segment(self, segment_id: int) -> List[Tuple[str, int, int, int]]:
+        """Index a segment from its bytes, cutting off a torn final line left by a crash."""
+        entries = []
+        path = self._segment_path(segment_id)
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                if "header" not in record:
+                    entries.append((record["session"], record["seq"], offset, len(line)))
+                offset += len(line)
+        if offset != os.path.getsize(path):
+            self.logger.warning(f"Truncating torn write at byte {offset} of {path}")
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        return entries
+
+    def _load_sidecar(self, segment_id: int) -> Optional[List[Tuple[str, int, int, int]]]:
+        try:
+            with open(self._sidecar_path(segment_id), encoding="utf-8") as f:
+                return [tuple(entry) for entry in json.load(f)["entries"]]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_sidecar(self, segment_id: int, entries: List[Tuple[str, int, int, int]]) -> None:
+        path = self._sidecar_path(segment_id)
+        with open(path + TMP_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump({"segment": segment_id, "entries": entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + TMP_SUFFIX, path)
+
+    def _add_entries(self, segment_id: int, entries: List[Tuple[str, int, int, int]]) -> None:
+        for session, seq, offset, length in entries:
+            self._index.setdefault(session, []).append((seq, segment_id, offset, length))
+            self._seq = max(self._seq, seq + 1)
+
+    def _remove_segment(self, segment_id: int) -> None:
+        for path in (self._segment_path(segment_id), self._sidecar_path(segment_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ---- Writing
+
+    def start(self) -> None:
+        if self._threads and all(t.is_alive() for t in self._threads):
+            return
+        self._threads = [threading.Thread(target=self._run_writer, name="transcript-writer", daemon=True)]
+        if self.compact_every:
+            self._threads.append(threading.Thread(target=self._run_compactor, name="transcript-compactor", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def append(self, session_id: str, role: str, content: str, **meta: Any) -> None:
+        """Queue one turn; it is durable after the writer's next group commit (see flush())."""
+        record = {"session": session_id, "ts": time.time(), "role": role, "content": content}
+        record.update(meta)
+        with self._lock:
+            self._submitted += 1
+        self._queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every turn appended so far has been fsynced."""
+        with self._committed:
+            target = self._submitted
+            return self._committed.wait_for(lambda: self._durable >= target, timeout)
+
+    def _run_writer(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:
+                self.logger.error(f"Transcript commit of {len(batch)} records failed: {e}")
+
+    def _commit(self, batch: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            first_seq = self._seq
+            self._seq += len(batch)
+        offset = self._active.tell()
+        entries = []
+        lines = []
+        for seq, record in enumerate(batch, first_seq):
+            record["seq"] = seq
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            entries.append((record["session"], seq, offset, len(line)))
+            lines.append(line)
+            offset += len(line)
+        self._active.write(b"".join(lines))
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        with self._committed:
+            self._add_entries(self._active_id, entries)
+            self._active_entries.extend(entries)
+            self._durable += len(batch)
+            self._commits += 1
+            self._committed.notify_all()
+        if offset >= self.segment_max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        # Open the next segment first so a failure below never leaves the writer without an active file.
+        sealed_id, sealed_entries, sealed = self._active_id, self._active_entries, self._active
+        with self._lock:
+            self._active_id = self._take_id()
+            self._active = open(self._segment_path(self._active_id), "ab")
+            self._active_entries = []
+        sealed.close()
+        with self._lock:
+            self._sealed.append(sealed_id)
+        try:
+            self._write_sidecar(sealed_id, sealed_entries)
+        except OSError as e:
+            # Recovery rebuilds a missing sidecar by scanning the segment.
+            self.logger.warning(f"Writing the index of transcript segment {sealed_id} failed: {e}")
+
+    # ---- Reading
+
+    def sessions(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
+
+    def replay(self, session_id: str) -> List[Dict[str, Any]]:
+        """Every durable turn of one session, oldest first."""
+        with self._lock:
+            entries = sorted(self._index.get(session_id, []))
+        records = []
+        handles = {}
+        try:
+            for _, segment_id, offset, length in entries:
+                f = handles.get(segment_id)
+                if f is None:
+                    f = handles[segment_id] = open(self._segment_path(segment_id), "rb")
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    # ---- Compaction
+
+    def _run_compactor(self) -> None:
+        while True:
+            time.sleep(self.compact_every)
+            try:
+                self.compact()
+            except Exception as e:
+                self.logger.error(f"Transcript compaction failed: {e}")
+
+    def compact(self) -> int:
+        """Merge all sealed segments into one, grouped by session; returns the number of segments replaced."""
+        with self._compact_lock:
+            with self._lock:
+                sources = list(self._sealed)
+            cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+            if len(sources) < 2 and cutoff is None:
+                return 0
+            source_set = set(sources)
+            with self._lock:
+                target_id = self._take_id()
+                by_session = {session: sorted(e for e in entries if e[1] in source_set)
+                              for session, entries in self._index.items()}
+            path = self._segment_path(target_id)
+            entries = []
+            dropped = 0
+            handles = {segment_id: open(self._segment_path(segment_id), "rb") for segment_id in sources}
+            try:
+                with open(path + TMP_SUFFIX, "wb") as out:
+                    out.write((json.dumps({"header": {"replaces": sources}}) + "\n").encode("utf-8"))
+                    for session, session_entries in by_session.items():
+                        rows = []
+                        for seq, segment_id, offset, length in session_entries:
+                            handles[segment_id].seek(offset)
+                            rows.append((seq, handles[segment_id].read(length)))
+                        if not rows:
+                            continue
+                        if cutoff is not None and json.loads(rows[-1][1])["ts"] < cutoff:
+                            dropped += 1
+                            continue
+                        for seq, line in rows:
+                            entries.append((session, seq, out.tell(), len(line)))
+                            out.write(line)
+                    out.flush()
+                    os.fsync(out.fileno())
+            finally:
+                for f in handles.values():
+                    f.close()
+            with self._lock:
+                # Commit point: from here on the header makes recovery drop the source segments.
+                os.replace(path + TMP_SUFFIX, path)
+                self._sealed = [s for s in self._sealed if s not in source_set] + [target_id]
+                for session in list(self._index):
+                    kept = [e for e in self._index[session] if e[1] not in source_set]
+                    if kept:
+                        self._index[session] = kept
+                    else:
+                        del self._index[session]
+                self._add_entries(target_id, entries)
+            self._write_sidecar(target_id, entries)
+            for segment_id in sources:
+                self._remove_segment(segment_id)
+            self.logger.info(f"Compacted {len(sources)} transcript segments into {target_id}; dropped {dropped} expired sessions")
+            return len(sources)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._index), "segments": len(self._sealed) + 1, "pending": self._submitted - self._durable,
+                    "durable": self._durable, "commits": self._commits}
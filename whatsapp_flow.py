@@ -0,0 +1,212 @@
+# WhatsApp guided flow: business data, pre-rendered TwiML replies and the stage
+# machine. Kept free of the engine and Twilio client so it imports on its own.
+import time
+from twilio.twiml.messaging_response import MessagingResponse
+from keyword_matcher import KeywordMatcher
+
+# Expert contact
+expert_name = "Mohammad"
+expert_phone_raw = "971505481357" 
+expert_phone_disp = "+971505481357"
+
+# ===== Business data =====
+services = {
+    "1": "Interior house painting",
+    "2": "Exterior house painting",
+    "3": "Villa painting service",
+    "4": "Decorative wall painting",
+    "5": "Kids room painting",
+    "6": "Commercial building painting",
+    "7": "Office painting",
+    "8": "Apartment paint",
+    "9": "Home painting",
+    "10": "Door Painting",
+    "11": "other options",
+}
+
+time_slots = {
+    "1": "Today 6–8 am",
+    "2": "Today 10–12 am",
+    "3": "Today 2–4 pm",
+    "4": "Today 4–6 pm",
+    "5": "Tomorrow 6–8 am",
+    "6": "Tomorrow 10–12 pm",
+    "7": "Tomorrow 2–4 pm",
+    "8": "Tomorrow 4–6 pm",
+}
+
+
+
+# Keywords
+PRICING_KEYWORDS = {
+    "price", "pricing", "prices", "priced",
+    "quote", "quotes", "quotation", "quotations",
+    "estimate", "estimates", "estimation",
+    "cost", "costs", "costing",
+    "rate", "rates",
+    "charge", "charges", "charging",
+    "fee", "fees",
+    "amount", "budget", "expense", "expenses",
+    "how much", "what is the cost", "what's the price",
+    "how much does it cost", "how much will it cost",
+    "what is the rate", "what's the rate",
+    "how much do you charge", "what do you charge"
+}
+GRATITUDE = {"thank you", "thanks", "thx", "thank u", "ty"}
+ACKS = {"ok", "okay", "k", "sure", "great", "cool", "fine", "got it"}
+MENU_COMMANDS = {"hi", "hello", "menu", "start"}
+pricing_matcher = KeywordMatcher(PRICING_KEYWORDS)
+
+# ===== Helpers =====
+def contains_pricing(text: str) -> bool:
+    return pricing_matcher.find(text) is not None
+
+def normalize(text: str) -> str:
+    return (text or "").lower().strip()
+
+class Reply(str):
+    """Rendered TwiML that keeps its plain message texts for the transcript."""
+    texts: tuple = ()
+
+def render(*messages: str) -> Reply:
+    tw = MessagingResponse()
+    for message in messages:
+        tw.message(message)
+    reply = Reply(str(tw))
+    reply.texts = messages
+    return reply
+
+# ===== Pre-rendered replies (static menus and prompts are serialized once) =====
+SERVICE_MENU = render(
+    "**Welcome to ServiceZone UAE! Please choose a painting service to get started:**\n\n"
+    + "".join(f"{key}. {name}\n" for key, name in services.items())
+    + f"Reply with the number of your choice (1 to {len(services)})"
+)
+SLOT_MENU_BODY = "".join(f"{key}. {slot}\n" for key, slot in time_slots.items()) + "Reply 1, 2,3,4,5,6,7 or 8"
+THANKS_AFTER_HANDOFF = render("👍 You're welcome! 😊 If you need anything else, just ask")
+THANKS = render("You're welcome! 😊 If you need anything else, just ask")
+EXPERT_CONTACT = render(
+    "Please contact our painting estimator directly for pricing questions:",
+    f"👤 {expert_name}",
+    "https://wa.me/971505481357",
+)
+HANDOFF_REPEAT = render("I've shared our estimator's contact above. You can message them directly via the link.")
+INVALID_SERVICE = render("Please reply with a valid number (1–11).")
+EMPTY_LOCATION = render("Location cannot be empty. Please type your location.")
+INVALID_ACTION = render("Please reply with 1 or 2.")
+INVALID_SLOT = render("Please reply with 1, 2, or 3 for slot selection.")
+FALLBACK = render("I don't know. Please connect with our expert.")
+EMPTY_TWIML = render()
+
+# Returned by a flow handler when the message must be answered by the RAG agent.
+ANSWER_WITH_RAG = object()
+
+def actions_menu(location: str) -> str:
+    return render(
+        f"Got it: {location}.\nWhat would you like to do next?\n"
+        "1. Book free site visit\n"
+        "2. Talk to expert\n"
+        "Reply with 1 or 2"
+    )
+
+def slot_menu(location: str) -> str:
+    return render(f"Please choose a time slot for a free site visit at {location}:\n" + SLOT_MENU_BODY)
+
+def is_after_step4(state: dict) -> bool:
+    return state.get("stage") == "handoff"
+
+def handoff_message(state: dict, user_id: str) -> str:
+    now = time.time()
+    last = state.get("handoff_time", 0)
+    if now - last < 30:
+        return HANDOFF_REPEAT
+
+    state["handoff_time"] = now
+    session_id = f"{user_id[-4:]}{int(now)}"
+    deep_link = f"https://wa.me/{expert_phone_raw}?text=Hi%20I'm%20from%20ServiceZone%20Ref%3A{session_id}"
+
+    return render(
+        "Got it — connecting you to our painting estimator now.",
+        f"Painting Estimator – {expert_name} ({expert_phone_disp})",
+        f"{deep_link}",
+    )
+
+# ===== Flow handlers: (state, body, user) -> TwiML string or ANSWER_WITH_RAG =====
+def on_menu(state: dict, body: str, user: str):
+    state.clear()
+    state["stage"] = "waiting_service"
+    return SERVICE_MENU
+
+def on_thanks(state: dict, body: str, user: str):
+    return THANKS_AFTER_HANDOFF if is_after_step4(state) else THANKS
+
+def on_pricing(state: dict, body: str, user: str):
+    # Pricing questions get the expert's contact (only valid AFTER step 4)
+    if is_after_step4(state):
+        return EXPERT_CONTACT
+    reply = handoff_message(state, user)
+    state["stage"] = "handoff"
+    return reply
+
+def on_handoff_question(state: dict, body: str, user: str):
+    return ANSWER_WITH_RAG
+
+def on_waiting_service(state: dict, body: str, user: str):
+    if body not in services:
+        return INVALID_SERVICE
+    state["service"] = services[body]
+    state["stage"] = "waiting_location"
+    return render(f"Great — {state['service']}.\nPlease type your location (community + building/landmark).")
+
+def on_waiting_location(state: dict, body: str, user: str):
+    if not body:
+        return EMPTY_LOCATION
+    state["location"] = body
+    state["stage"] = "offer_actions"
+    return actions_menu(state["location"])
+
+def on_offer_actions(state: dict, body: str, user: str):
+    if body == "1":
+        state["stage"] = "choose_slot"
+        return slot_menu(state["location"])
+    if body == "2":
+        reply = handoff_message(state, user)
+        state["stage"] = "handoff"
+        return reply
+    return INVALID_ACTION
+
+def on_choose_slot(state: dict, body: str, user: str):
+    if body not in time_slots:
+        return INVALID_SLOT
+    state["slot"] = time_slots[body]
+    state["stage"] = "handoff"
+    return render(
+        f"Booked ✅\n"
+        f"Slot: {state['slot']}\n"
+        f"Location: {state['location']}\n"
+        f"Our team will reach out shortly."
+    )
+
+# Global rules are checked in order before the per-stage handler.
+GLOBAL_RULES = [
+    (lambda state, body: body in MENU_COMMANDS, on_menu),
+    (lambda state, body: body in GRATITUDE or body in ACKS, on_thanks),
+    (lambda state, body: contains_pricing(body), on_pricing),
+    (lambda state, body: state.get("stage") == "handoff", on_handoff_question),
+]
+STAGE_HANDLERS = {
+    "waiting_service": on_waiting_service,
+    "waiting_location": on_waiting_location,
+    "offer_actions": on_offer_actions,
+    "choose_slot": on_choose_slot,
+}
+
+def advance(state: dict, body: str, user: str):
+    """Apply one message to the user's stage machine in place and return the reply."""
+    for matches, handler in GLOBAL_RULES:
+        if matches(state, body):
+            return handler(state, body, user)
+    handler = STAGE_HANDLERS.get(state.get("stage"))
+    if handler is None:
+        return FALLBACK
+    return handler(state, body, user)
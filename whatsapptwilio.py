@@ -1,18 +1,38 @@
 # filename: whatsapptwilio.py
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
-from twilio.twiml.messaging_response import MessagingResponse
 from twilio.rest import Client   # NEW
-import time
 import os
-from main import SalesRAGAgent
+import asyncio
+from sales_rag_bot import SalesRAGEngine
+from conversation_pool import ConversationPool
+from reply_dispatcher import DeferredReplyDispatcher
+from admin_notifier import AdminNotifier
+from message_dedup import MessageDedup
+from session_store import SQLiteSessionStore, make_session_store
+from whatsapp_flow import ANSWER_WITH_RAG, EMPTY_TWIML, advance, normalize, render
+from lead_tool import extraction_stats
+from transcript_store import TranscriptStore, DirectoryLocked
 
 app = FastAPI()
 
-# Initialize chatbot with the specific PDF
-pdf_path = 'ServiceZoneUAE.pdf'
-chatbot = SalesRAGAgent(pdf_path)
-sessions = {}  # simple in-memory session store
+# Shared engine (LLM, vector store, Salesforce) + one lightweight agent per WhatsApp user
+pdf_path = os.getenv("KNOWLEDGE_BASE", 'ServiceZoneUAE.pdf')  # a PDF or a directory of PDFs
+engine = SalesRAGEngine(pdf_path)
+conversations = ConversationPool(engine, max_size=5000, idle_timeout=1800)
+sessions = make_session_store()  # SESSION_STORE_URL=sqlite:///sessions.db to share across workers
+# Append-only transcripts indexed by phone number. A directory has one writer
+# process, so with several uvicorn workers each extra worker takes the first
+# free worker-<n> subdirectory.
+def open_transcripts(directory: str, max_workers: int = 64) -> TranscriptStore:
+    for n in range(max_workers + 1):
+        try:
+            return TranscriptStore(directory if n == 0 else os.path.join(directory, f"worker-{n}"))
+        except DirectoryLocked:
+            continue
+    raise DirectoryLocked(f"All {max_workers + 1} transcript directories under {directory} are in use")
+
+transcripts = open_transcripts(os.getenv("TRANSCRIPT_DIR", "chat_history/whatsapp"))
 
 # ===== Twilio Config (NEW) =====
 ACCOUNT_SID = os.getenv("ACCOUNT_SID") 
@@ -22,251 +42,120 @@ TWILIO_WHATSAPP = "whatsapp:+971557021859"   # Twilio sandbox or WhatsApp enable
 ADMIN_NOTIFY_NUMBER = "whatsapp:+971505481357"   # your number to receive alerts
 client = Client(ACCOUNT_SID, AUTH_TOKEN)
 
-# Expert contact
-expert_name = "Mohammad"
-expert_phone_raw = "971505481357" 
-expert_phone_disp = "+971505481357"
-
-# ===== Business data =====
-services = {
-    "1": "Interior house painting",
-    "2": "Exterior house painting",
-    "3": "Villa painting service",
-    "4": "Decorative wall painting",
-    "5": "Kids room painting",
-    "6": "Commercial building painting",
-    "7": "Office painting",
-    "8": "Apartment paint",
-    "9": "Home painting",
-    "10": "Door Painting",
-    "11": "other options",
-}
-
-time_slots = {
-    "1": "Today 6–8 am",
-    "2": "Today 10–12 am",
-    "3": "Today 2–4 pm",
-    "4": "Today 4–6 pm",
-    "5": "Tomorrow 6–8 am",
-    "6": "Tomorrow 10–12 pm",
-    "7": "Tomorrow 2–4 pm",
-    "8": "Tomorrow 4–6 pm",
-}
-
-
-
-# Keywords
-PRICING_KEYWORDS = {
-    "price", "pricing", "prices", "priced",
-    "quote", "quotes", "quotation", "quotations",
-    "estimate", "estimates", "estimation",
-    "cost", "costs", "costing",
-    "rate", "rates", "rating",
-    "charge", "charges", "charging",
-    "fee", "fees",
-    "amount", "budget", "expense", "expenses",
-    "how much", "what is the cost", "what's the price",
-    "how much does it cost", "how much will it cost",
-    "what is the rate", "what's the rate",
-    "how much do you charge", "what do you charge"
-}
-GRATITUDE = {"thank you", "thanks", "thx", "thank u", "ty"}
-ACKS = {"ok", "okay", "k", "sure", "great", "cool", "fine", "got it"}
-
-# ===== Helpers =====
-def contains_pricing(text: str) -> bool:
-    t = (text or "").lower()
-    return any(k in t for k in PRICING_KEYWORDS)
-
-def normalize(text: str) -> str:
-    return (text or "").lower().strip()
-
-def send_service_menu(tw: MessagingResponse) -> None:
-    tw.message(
-        "**Welcome to ServiceZone UAE! Please choose a painting service to get started:**\n\n"
-        "1. Interior house painting\n"
-        "2. Exterior house painting\n"
-        "3. Villa painting service\n"
-        "4. Decorative wall painting\n"
-        "5. Kids room painting\n"
-        "6. Commercial building painting\n"
-        "7. Office painting\n"
-        "8. Apartment paint\n"
-        "9. Home painting\n"
-        "10. Door Painting\n"
-        "11. other options\n"
-        "Reply with the number of your choice (1 to 11)"
-    )
-
-def send_actions_menu(tw: MessagingResponse, location: str) -> None:
-    tw.message(
-        f"Got it: {location}.\nWhat would you like to do next?\n"
-        "1. Book free site visit\n"
-        "2. Talk to expert\n"
-        "Reply with 1 or 2"
-    )
-
-def send_slot_menu(tw: MessagingResponse, location: str) -> None:
-    tw.message(
-        f"Please choose a time slot for a free site visit at {location}:\n"
-        "1. Today 6–8 am\n"
-        "2. Today 10–12 am\n"
-        "3. Today 2–4 pm\n"
-        "4. Today 4–6 pm\n"        
-        "5. Tomorrow 6–8 am\n"
-        "6. Tomorrow 10–12 pm\n"        
-        "7. Tomorrow 2–4 pm\n"
-        "8. Tomorrow 4–6 pm\n"
-        "Reply 1, 2,3,4,5,6,7 or 8"
-    )
-
-def is_after_step4(state: dict) -> bool:
-    return state.get("stage") == "handoff"
-
-def handoff_message(tw: MessagingResponse, state: dict, user_id: str) -> None:
-    now = time.time()
-    last = state.get("handoff_time", 0)
-    if now - last < 30:
-        tw.message("I've shared our estimator's contact above. You can message them directly via the link.")
-        return
-
-    state["handoff_time"] = now
-    session_id = f"{user_id[-4:]}{int(now)}"
-    deep_link = f"https://wa.me/{expert_phone_raw}?text=Hi%20I'm%20from%20ServiceZone%20Ref%3A{session_id}"
-
-    tw.message("Got it — connecting you to our painting estimator now.")
-    tw.message(f"Painting Estimator – {expert_name} ({expert_phone_disp})")
-    tw.message(f"{deep_link}")
-
-def send_expert_contact(tw: MessagingResponse) -> None:
-    tw.message(f"Please contact our painting estimator directly for pricing questions:")
-    tw.message(f"👤 {expert_name}")
-    tw.message("https://wa.me/971505481357")
-
-def handle_irrelevant_question(tw: MessagingResponse, user: str, body: str) -> None:
+async def answer_question(user: str, body: str) -> str:
+    return (await conversations.get(user).aprocess(body))['response']
+
+def send_whatsapp(user: str, text: str) -> None:
+    client.messages.create(from_=TWILIO_WHATSAPP, to=f"whatsapp:{user}", body=text)
+    transcripts.append(user, "assistant", text, channel="whatsapp", deferred=True)
+
+# ===== Deferred replies =====
+# With DEFERRED_REPLIES=1 the handoff-stage RAG answer is computed on a bounded
+# worker pool and sent via the REST API, and the webhook returns empty TwiML at once.
+DEFERRED_REPLIES = os.getenv("DEFERRED_REPLIES", "0") == "1"
+reply_dispatcher = DeferredReplyDispatcher(
+    answer_question,
+    send_whatsapp,
+    workers=int(os.getenv("REPLY_WORKERS", "8")),
+    max_queue=int(os.getenv("REPLY_QUEUE_SIZE", "1000")),
+)
+
+async def handle_irrelevant_question(user: str, body: str) -> str:
     print(f"Irrelevant question from user {user}: '{body}'")
-    reply_text = chatbot.process(body)['response']
+    if DEFERRED_REPLIES and reply_dispatcher.submit(user, body):
+        print(f"Reply for {user} deferred to background worker")
+        return EMPTY_TWIML
+    reply_text = await answer_question(user, body)
     print(f"reply_text : '{reply_text}'")
-    tw.message(reply_text)
-    print(f"Response added to tw object")
+    return render(reply_text)
 
 
 import json
-def notify_admin_new_user(user: str, body: str) -> None:
-    try:
-        client.messages.create(
-            from_=TWILIO_WHATSAPP,
-            to=ADMIN_NOTIFY_NUMBER,
-            content_sid=Content_Template_SID,  
-            content_variables=json.dumps({
-                "1": f"{user}"
-            })
-        )
-        print(f"✅ Notified admin about first-time user {user}")
-    except Exception as e:
-        print(f"❌ Failed to notify admin: {e}")
+def send_admin_notification(users: str) -> None:
+    client.messages.create(
+        from_=TWILIO_WHATSAPP,
+        to=ADMIN_NOTIFY_NUMBER,
+        content_sid=Content_Template_SID,  
+        content_variables=json.dumps({
+            "1": f"{users}"
+        })
+    )
 
+# New-user alerts go through a background queue; ADMIN_DIGEST_SECONDS > 0 batches
+# every user seen in that window into a single admin message.
+admin_notifier = AdminNotifier(
+    send_admin_notification,
+    digest_window=float(os.getenv("ADMIN_DIGEST_SECONDS", "0")),
+)
+
+
+# ===== Background workers =====
+@app.on_event("startup")
+async def start_background_workers():
+    transcripts.start()
+    await admin_notifier.start()
+    if DEFERRED_REPLIES:
+        await reply_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await reply_dispatcher.stop()
+    await admin_notifier.stop()
+    transcripts.flush(timeout=5)
+
+@app.post("/knowledge/refresh")
+async def refresh_knowledge():
+    # Re-scan KNOWLEDGE_BASE; only new or changed PDFs are embedded and the index is swapped in place.
+    changed = await asyncio.to_thread(engine.pdf_qa_tool.refresh)
+    return {"changed": changed, **engine.pdf_qa_tool.corpus_manager.stats()}
+
+@app.get("/stats")
+async def stats():
+    return {"conversations": conversations.stats(), "deferred_replies": reply_dispatcher.stats(),
+            "admin_notifier": admin_notifier.stats(), "message_dedup": message_dedup.stats(), "sessions": sessions.stats(),
+            "transcripts": transcripts.stats(), "lead_extraction": extraction_stats(),
+            "answer_cache": engine.pdf_qa_tool.answer_cache.stats(), "topic": engine.pdf_qa_tool.topic_stats(),
+            "retrieval": engine.pdf_qa_tool.retrieval_stats(), "availability": engine.salesforce.availability_stats(),
+            "salesforce_outbox": engine.outbox.stats() if engine.outbox is not None else None,
+            "intent_router": engine.intent_router.stats() if engine.intent_router is not None else None}
 
 # ===== Webhook =====
+# Twilio retries slow webhooks with the same MessageSid; replay the first response.
+# With the SQLite session store, SIDs are claimed in the same file so a retry
+# that reaches another worker is deduplicated too.
+message_dedup = MessageDedup(max_entries=10000, ttl=600,
+                             path=sessions.path if isinstance(sessions, SQLiteSessionStore) else None)
+
 @app.post("/webhook/whatsapp")
 async def whatsapp_webhook(request: Request):
     form = await request.form()
+    twiml = await message_dedup.run(form.get("MessageSid"), lambda: handle_message(form))
+    return Response(twiml, media_type="application/xml")
+
+async def handle_message(form) -> str:
     body = normalize(form.get("Body"))
     user = (form.get("From") or "").replace("whatsapp:", "")
-
-    # --- First time user detection (NEW) ---
-    if user not in sessions:
-        notify_admin_new_user(user, body)
-
-    state = sessions.get(user, {"stage": "waiting_service"})
-    tw = MessagingResponse()
-
-    # ---- Global commands
-    if body in {"hi", "hello", "menu", "start"}:
-        state = {"stage": "waiting_service"}
-        send_service_menu(tw)
-        sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    # ---- Global gratitude / acknowledgements
-    if body in GRATITUDE or body in ACKS:
-        if is_after_step4(state):
-            tw.message("👍 You're welcome! 😊 If you need anything else, just ask")
-        else:
-            tw.message("You're welcome! 😊 If you need anything else, just ask")
-        return Response(str(tw), media_type="application/xml")
-
-    # ---- Global pricing trigger (only valid AFTER step 4)
-    if contains_pricing(body):
-        if is_after_step4(state):
-            send_expert_contact(tw)
-        else:
-            handoff_message(tw, state, user)
-            state["stage"] = "handoff"
-            sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    # ---- If already handed off - handle irrelevant questions
-    if state.get("stage") == "handoff":
-        if body in GRATITUDE or body in ACKS:
-            pass
-        elif contains_pricing(body):
-            pass
-        else:
-            print(f"Irrelevant question in handoff stage from {user}: '{body}'")
-            handle_irrelevant_question(tw, user, body)
-        return Response(str(tw), media_type="application/xml")
-
-    # ===== Stage machine =====
-    if state["stage"] == "waiting_service":
-        if body in services:
-            state["service"] = services[body]
-            state["stage"] = "waiting_location"
-            tw.message(
-                f"Great — {state['service']}.\nPlease type your location (community + building/landmark)."
-            )
-        else:
-            tw.message("Please reply with a valid number (1–11).")
-        sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    if state["stage"] == "waiting_location":
-        if body:
-            state["location"] = body
-            state["stage"] = "offer_actions"
-            send_actions_menu(tw, state["location"])
-        else:
-            tw.message("Location cannot be empty. Please type your location.")
-        sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    if state["stage"] == "offer_actions":
-        if body == "1":
-            state["stage"] = "choose_slot"
-            send_slot_menu(tw, state["location"])
-        elif body == "2":
-            handoff_message(tw, state, user)
-            state["stage"] = "handoff"
-        else:
-            tw.message("Please reply with 1 or 2.")
-        sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    if state["stage"] == "choose_slot":
-        if body in time_slots:
-            state["slot"] = time_slots[body]
-            tw.message(
-                f"Booked ✅\n"
-                f"Slot: {state['slot']}\n"
-                f"Location: {state['location']}\n"
-                f"Our team will reach out shortly."
-            )
-            state["stage"] = "handoff"
-        else:
-            tw.message("Please reply with 1, 2, or 3 for slot selection.")
-        sessions[user] = state
-        return Response(str(tw), media_type="application/xml")
-
-    # ===== Fallback =====
-    tw.message("I don't know. Please connect with our expert.")
-    return Response(str(tw), media_type="application/xml")
+    outcome = {}
+
+    def step(state):
+        # --- First time user detection (NEW) ---
+        if state is None:
+            outcome["new_user"] = True
+            state = {"stage": "waiting_service"}
+        outcome["reply"] = advance(state, body, user)
+        return state
+
+    # The stage machine runs inside the store's atomic read-modify-write; the
+    # slow RAG answer (if any) is produced afterwards, outside the transaction.
+    # SQLite may block on BEGIN IMMEDIATE, so keep it off the event loop.
+    await asyncio.to_thread(sessions.update, user, step)
+    if outcome.get("new_user"):
+        admin_notifier.notify(user)
+    transcripts.append(user, "user", form.get("Body") or "", channel="whatsapp", message_sid=form.get("MessageSid"))
+    reply = outcome["reply"]
+    if reply is ANSWER_WITH_RAG:
+        print(f"Irrelevant question in handoff stage from {user}: '{body}'")
+        reply = await handle_irrelevant_question(user, body)
+    for text in reply.texts:
+        transcripts.append(user, "assistant", text, channel="whatsapp")
+    return reply